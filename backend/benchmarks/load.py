@@ -0,0 +1,147 @@
+"""Shift-change load test: a burst of punches while dashboards keep polling.
+
+Usage (from backend/, with the app running):
+    python -m benchmarks.load --base-url http://localhost:8000 --workers 400 --window 60
+
+Replays the 06:55-07:05 peak compressed into --window seconds: every worker sends
+one POST /api/punch at a time drawn from a bell curve centred on the window, while
+--dashboards clients poll GET /api/hours/today and GET /api/calendar. Reports
+p50/p95/p99 latency, errors and connection pool wait (from the app's Server-Timing
+header) per endpoint. The punches are real writes: use a scratch database.
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import sys
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+import httpx
+import numpy as np
+
+_POOL_TIMING = re.compile(r'db-pool;dur=([\d.]+)')
+
+PERCENTILES = (50, 95, 99)
+
+@dataclass
+class EndpointStats:
+    latencies: list[float] = field(default_factory=list)
+    pool_waits: list[float] = field(default_factory=list)
+    errors: int = 0
+    status_codes: dict[int, int] = field(default_factory=lambda: defaultdict(int))
+
+    def report(self, elapsed: float) -> dict:
+        def percentiles(values: list[float]) -> dict[str, float]:
+            if not values:
+                return {}
+            return {f'p{p}_ms': round(float(v), 3)
+                    for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))}
+        return {
+            'requests': len(self.latencies),
+            'errors': self.errors,
+            'rps': round(len(self.latencies) / elapsed, 2) if elapsed else 0.0,
+            'latency': percentiles(self.latencies),
+            'pool_wait': percentiles(self.pool_waits),
+            'status_codes': dict(self.status_codes),
+        }
+
+class LoadTest:
+    def __init__(self, client: httpx.AsyncClient, concurrency: int):
+        self.client = client
+        # Caps in-flight requests, like a limited number of kiosks / proxy connections
+        self.slots = asyncio.Semaphore(concurrency)
+        self.stats: dict[str, EndpointStats] = defaultdict(EndpointStats)
+
+    async def request(self, name: str, method: str, url: str, **kwargs) -> None:
+        stats = self.stats[name]
+        async with self.slots:
+            started = time.perf_counter()
+            try:
+                response = await self.client.request(method, url, **kwargs)
+            except httpx.HTTPError:
+                stats.latencies.append((time.perf_counter() - started) * 1000)
+                stats.errors += 1
+                return
+        stats.latencies.append((time.perf_counter() - started) * 1000)
+        stats.status_codes[response.status_code] += 1
+        if response.status_code >= 400:
+            stats.errors += 1
+        timing = _POOL_TIMING.search(response.headers.get('server-timing', ''))
+        if timing:
+            stats.pool_waits.append(float(timing.group(1)))
+
+    async def worker_punch(self, delay: float, entry_type: str) -> None:
+        await asyncio.sleep(delay)
+        await self.request('POST /api/punch', 'POST', '/api/punch', json={'entry_type': entry_type})
+
+    async def dashboard(self, deadline: float, interval: float, offset: float) -> None:
+        await asyncio.sleep(offset)
+        while time.perf_counter() < deadline:
+            await asyncio.gather(
+                self.request('GET /api/hours/today', 'GET', '/api/hours/today'),
+                self.request('GET /api/calendar', 'GET', '/api/calendar'),
+            )
+            await asyncio.sleep(interval)
+
+async def run(args: argparse.Namespace) -> dict:
+    rng = random.Random(args.seed)
+    # Arrivals peak mid-window (07:00) and thin out towards both ends
+    centre, spread = args.window / 2, args.window / 6
+    delays = [min(max(rng.gauss(centre, spread), 0.0), args.window) for _ in range(args.workers)]
+    # Night shift leaving while the day shift arrives
+    entry_types = ['out' if rng.random() < args.out_ratio else 'in' for _ in range(args.workers)]
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+        test = LoadTest(client, args.concurrency)
+        started = time.perf_counter()
+        deadline = started + args.window
+        await asyncio.gather(
+            *(test.worker_punch(delay, entry_type) for delay, entry_type in zip(delays, entry_types)),
+            *(test.dashboard(deadline, args.poll_interval, rng.uniform(0, args.poll_interval))
+              for _ in range(args.dashboards)),
+        )
+        elapsed = time.perf_counter() - started
+
+    return {
+        'config': {key: value for key, value in vars(args).items() if key != 'output'},
+        'elapsed_seconds': round(elapsed, 3),
+        'endpoints': {name: stats.report(elapsed) for name, stats in sorted(test.stats.items())},
+    }
+
+def print_report(report: dict) -> None:
+    print(f"{'endpoint':24s} {'reqs':>6s} {'err':>5s} {'rps':>7s} "
+          f"{'p50':>8s} {'p95':>8s} {'p99':>8s} {'pool p50':>9s} {'pool p95':>9s} {'pool p99':>9s}  (ms)")
+    for name, endpoint in report['endpoints'].items():
+        latency, pool = endpoint['latency'], endpoint['pool_wait']
+        print(f"{name:24s} {endpoint['requests']:6d} {endpoint['errors']:5d} {endpoint['rps']:7.1f} "
+              + " ".join(f"{latency.get(f'p{p}_ms', 0):8.1f}" for p in PERCENTILES) + " "
+              + " ".join(f"{pool.get(f'p{p}_ms', 0):9.2f}" for p in PERCENTILES))
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Shift-change load test")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--workers", type=int, default=300, help="punching workers in the burst")
+    parser.add_argument("--window", type=float, default=60.0, help="seconds the 10-minute peak is compressed into")
+    parser.add_argument("--out-ratio", type=float, default=0.2, help="share of punches that are clock-outs")
+    parser.add_argument("--dashboards", type=int, default=10, help="polling dashboard clients")
+    parser.add_argument("--poll-interval", type=float, default=2.0)
+    parser.add_argument("--concurrency", type=int, default=100, help="max requests in flight")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the report as JSON to this file")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+            file.write('\n')
+    return 1 if any(endpoint['errors'] for endpoint in report['endpoints'].values()) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
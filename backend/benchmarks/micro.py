@@ -0,0 +1,259 @@
+"""Micro-benchmarks of the payroll calculator and database.py queries.
+
+Usage (from backend/):
+    python -m benchmarks.micro --employees 50 --months 3 --output bench.json
+    python -m benchmarks.micro --db --compare baseline.json
+
+Calculator functions are timed on in-memory synthetic data. With --db the same
+data is loaded into DATABASE_URL and the query functions are timed too; this
+TRUNCATES the time tracking tables, so point it at a scratch database.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from typing import Any, Awaitable, Callable
+
+import numpy as np
+import pendulum
+
+import database as db
+from payroll import PayrollCalculator
+from payroll_core import PayRules
+from payroll_replay import ReplayEngine, Scenario
+from time_entry_batch import TimeEntryBatch
+
+from benchmarks import synthetic
+
+PERCENTILES = (50, 90, 95, 99)
+
+def summarize(durations: list[float]) -> dict[str, float]:
+    """Milliseconds statistics of a list of durations in seconds"""
+    millis = np.asarray(durations) * 1000
+    stats = {'runs': len(durations), 'min_ms': float(millis.min()), 'mean_ms': float(millis.mean())}
+    for percentile, value in zip(PERCENTILES, np.percentile(millis, PERCENTILES)):
+        stats[f'p{percentile}_ms'] = float(value)
+    stats['max_ms'] = float(millis.max())
+    return {key: round(value, 4) if isinstance(value, float) else value for key, value in stats.items()}
+
+def measure(func: Callable[[], Any], repeat: int, warmup: int) -> dict[str, float]:
+    for _ in range(warmup):
+        func()
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - started)
+    return summarize(durations)
+
+async def measure_async(func: Callable[[], Awaitable[Any]], repeat: int, warmup: int) -> dict[str, float]:
+    for _ in range(warmup):
+        await func()
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await func()
+        durations.append(time.perf_counter() - started)
+    return summarize(durations)
+
+def first_period(workforce: synthetic.Workforce) -> tuple[pendulum.DateTime, pendulum.DateTime]:
+    return PayrollCalculator.get_15_day_period_bounds(pendulum.date(workforce.start.year, workforce.start.month, 1))
+
+# Threshold x overtime multiplier grid priced by the what-if replay benchmarks
+REPLAY_SCENARIOS = [
+    Scenario(f"threshold {threshold}h x{multiplier}",
+             PayRules(overtime_threshold=Decimal(threshold), overtime_multiplier=Decimal(multiplier)))
+    for threshold in ('7', '8', '9', '10') for multiplier in ('1.15', '1.25', '1.5')
+]
+
+def calculator_benchmarks(workforce: synthetic.Workforce, repeat: int, warmup: int) -> dict[str, dict]:
+    """Time the calculator on in-memory entries of the first 15-day period"""
+    start, end = first_period(workforce)
+    entries = [entry for entry in workforce.entries if start <= entry['punch_time'] <= end]
+    current_time = pendulum.instance(datetime.combine(workforce.end, datetime.max.time(), timezone.utc))
+    rate = workforce.employees[0]['hourly_rate']
+
+    # calculate_daily_hours is timed over every (employee, day) punch list of the period
+    employee_days: dict[tuple, list] = {}
+    for entry in entries:
+        if entry['entry_type'] in ('in', 'out'):
+            employee_days.setdefault((entry['employee_id'], entry['punch_time'].date()), []).append(entry)
+    day_lists = list(employee_days.values())
+
+    batch = TimeEntryBatch.from_entries(entries)
+
+    return {
+        'calculate_daily_hours[all employee-days]': measure(
+            lambda: [PayrollCalculator.calculate_daily_hours(day, current_time) for day in day_lists], repeat, warmup),
+        '_group_entries_by_date': measure(
+            lambda: PayrollCalculator._group_entries_by_date(entries), repeat, warmup),
+        'calculate_pay_from_entries': measure(
+            lambda: PayrollCalculator.calculate_pay_from_entries(entries, rate, start, end, current_time),
+            repeat, warmup),
+        'calculate_pay_from_batch': measure(
+            lambda: PayrollCalculator.calculate_pay_from_batch(batch, rate, start, end, current_time),
+            repeat, warmup),
+        'calculate_pay_from_arrays': measure(
+            lambda: PayrollCalculator.calculate_pay_from_arrays(batch.punch_micros, batch.entry_codes, rate, start, end,
+                                                                current_time), repeat, warmup),
+        **replay_benchmarks(workforce, current_time, repeat, warmup),
+    }
+
+def replay_benchmarks(workforce: synthetic.Workforce, current_time: pendulum.DateTime,
+                      repeat: int, warmup: int) -> dict[str, dict]:
+    """Time the what-if replay over the whole workforce: one load, then a scenario grid"""
+    start = pendulum.datetime(workforce.start.year, workforce.start.month, workforce.start.day)
+    end = pendulum.datetime(workforce.end.year, workforce.end.month, workforce.end.day).end_of('day')
+    rates = {employee['id']: employee['hourly_rate'] for employee in workforce.employees}
+    batch = TimeEntryBatch.from_entries(workforce.entries)
+    engine = ReplayEngine.from_entries(workforce.entries, rates, start, end, current_time)
+    return {
+        'ReplayEngine.from_entries[all]': measure(
+            lambda: ReplayEngine.from_entries(workforce.entries, rates, start, end, current_time),
+            repeat, warmup),
+        'ReplayEngine.from_batch[all]': measure(
+            lambda: ReplayEngine.from_batch(batch, rates, start, end, current_time), repeat, warmup),
+        f'ReplayEngine.evaluate[{len(REPLAY_SCENARIOS)} scenarios]': measure(
+            lambda: engine.evaluate(REPLAY_SCENARIOS), repeat, warmup),
+    }
+
+async def load_database(workforce: synthetic.Workforce) -> None:
+    """Replace the time tracking data of DATABASE_URL with the synthetic workforce"""
+    await db.init_database()
+    await db.ensure_time_entry_partitions(entry['punch_time'] for entry in workforce.entries)
+    async with db.db_manager.get_connection() as conn:
+        async with conn.transaction():
+            await conn.execute("""
+                TRUNCATE time_entries, timesheet_cells, daily_work_summary, payroll_snapshots, employees
+                RESTART IDENTITY CASCADE
+            """)
+            await conn.copy_records_to_table(
+                'employees',
+                records=[(employee['id'], employee['name'], employee['last_name'], employee['hourly_rate'])
+                         for employee in workforce.employees],
+                columns=['id', 'name', 'last_name', 'hourly_rate'])
+            await conn.execute("SELECT setval('employees_id_seq', $1)", len(workforce.employees))
+            await conn.copy_records_to_table(
+                'time_entries',
+                records=[(entry['employee_id'], entry['punch_time'], entry['entry_type'])
+                         for entry in workforce.entries],
+                columns=['employee_id', 'punch_time', 'entry_type'])
+            await conn.execute("ANALYZE time_entries")
+    await db.rebuild_daily_work_summary()
+    db.tables_changed("employees", "settings", "time_entries")
+
+async def database_benchmarks(workforce: synthetic.Workforce, repeat: int, warmup: int) -> dict[str, dict]:
+    """Time the query functions (and uncached payroll) against the loaded database"""
+    start, end = first_period(workforce)
+    month_start = date(workforce.start.year, workforce.start.month, 1)
+    month_end = pendulum.date(month_start.year, month_start.month, 1).end_of('month')
+
+    async def drain_employee_summaries():
+        async for _ in db.iter_employee_daily_summaries(start.date(), end.date()):
+            pass
+
+    results = {
+        'get_time_entry_batch[15 days]': await measure_async(
+            lambda: db.get_time_entry_batch(start, end), repeat, warmup),
+        'get_daily_summaries_for_period[15 days]': await measure_async(
+            lambda: db.get_daily_summaries_for_period(start.date(), end.date()), repeat, warmup),
+        'iter_employee_daily_summaries[15 days]': await measure_async(
+            drain_employee_summaries, repeat, warmup),
+        'get_timesheet_grid[month]': await measure_async(
+            lambda: db.get_timesheet_grid(month_start, month_end), repeat, warmup),
+    }
+    for engine in ('python', 'numpy', 'summary', 'sql'):
+        # _compute_period_pay skips the closed-period snapshot, so every run does the work
+        results[f'calculate_period_pay[{engine}, uncached]'] = await measure_async(
+            lambda: PayrollCalculator._compute_period_pay(start, end, engine), repeat, warmup)
+    results['calculate_period_pay[snapshot]'] = await measure_async(
+        lambda: PayrollCalculator.calculate_period_pay(start, end, 'python'), repeat, warmup)
+    return results
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def compare(results: dict[str, dict], baseline: dict[str, dict], max_regression: float) -> list[str]:
+    """Print p50 changes against a baseline run; returns the names that regressed"""
+    regressions = []
+    for name, stats in results.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]['p50_ms'], stats['p50_ms']
+        change = (after - before) / before if before else 0.0
+        flag = ''
+        if change > max_regression:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:50s} {before:10.3f} -> {after:10.3f} ms  {change:+7.1%}{flag}")
+    return regressions
+
+async def run(args: argparse.Namespace) -> dict:
+    workforce = synthetic.generate(args.employees, args.months, date.fromisoformat(args.start), args.seed)
+    results = calculator_benchmarks(workforce, args.repeat, args.warmup)
+
+    if args.db:
+        await db.db_manager.create_pool()
+        try:
+            await load_database(workforce)
+            results.update(await database_benchmarks(workforce, args.repeat, args.warmup))
+        finally:
+            await db.db_manager.close_pool()
+
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'recorded_at': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'employees': args.employees,
+            'months': args.months,
+            'start': args.start,
+            'seed': args.seed,
+            'entries': len(workforce.entries),
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Payroll micro-benchmarks")
+    parser.add_argument("--employees", type=int, default=50)
+    parser.add_argument("--months", type=int, default=3)
+    parser.add_argument("--start", default="2024-01-01", help="first day of the synthetic data")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--db", action="store_true",
+                        help="also benchmark queries; replaces the data in DATABASE_URL")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="baseline JSON to compare p50s against")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="p50 slowdown (fraction) that fails --compare")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output + '\n')
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        if compare(report['results'], baseline['results'], args.max_regression):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""Deterministic synthetic workforce: N employees x M months of realistic punches.
+
+The same (employees, months, start, seed) always yields the same rows, so timings
+from different commits measure the same work.
+"""
+import random
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+import pendulum
+
+# (weight, start minute of day, shift length in minutes); night shifts cross midnight
+SHIFT_PATTERNS = {
+    'day': (0.7, 7 * 60, 9 * 60),
+    'early': (0.2, 6 * 60, 8 * 60 + 30),
+    'night': (0.1, 22 * 60, 8 * 60),
+}
+
+SATURDAY_WORK_RATE = 0.35
+SUNDAY_WORK_RATE = 0.1
+LUNCH_BREAK_RATE = 0.5
+FORGOTTEN_CLOCK_OUT_RATE = 0.01
+SICK_SPELL_RATE = 0.01
+VACATION_BLOCK_RATE = 0.004
+
+@dataclass
+class Workforce:
+    employees: list[dict]
+    # Sorted by punch_time; time entry dicts (id, employee_id, punch_time, entry_type)
+    entries: list[dict] = field(default_factory=list)
+    start: date = date(2024, 1, 1)
+    end: date = date(2024, 1, 31)
+
+def _add_months(day: date, months: int) -> date:
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def _punch(day: date, minute: int, rng: random.Random) -> datetime:
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc) + timedelta(
+        minutes=minute, seconds=rng.randrange(60), microseconds=rng.randrange(1_000_000))
+
+def _shift_entries(day: date, pattern: str, rng: random.Random) -> list[tuple[datetime, str]]:
+    _, start_minute, length = SHIFT_PATTERNS[pattern]
+    start = start_minute + rng.randint(-10, 10)
+    end = start + length + rng.randint(-20, 40)
+    entries = [(_punch(day, start, rng), 'in')]
+    if rng.random() < LUNCH_BREAK_RATE:
+        lunch = start + length // 2
+        entries += [(_punch(day, lunch, rng), 'out'), (_punch(day, lunch + 30, rng), 'in')]
+    if rng.random() >= FORGOTTEN_CLOCK_OUT_RATE:
+        entries.append((_punch(day, end, rng), 'out'))
+    return entries
+
+def generate(employees: int = 50, months: int = 3, start: date = date(2024, 1, 1), seed: int = 42) -> Workforce:
+    """Generate punches for ``employees`` people over ``months`` months from ``start``"""
+    rng = random.Random(seed)
+    end = _add_months(date(start.year, start.month, 1), months) - timedelta(days=1)
+    patterns = list(SHIFT_PATTERNS)
+    weights = [SHIFT_PATTERNS[pattern][0] for pattern in patterns]
+
+    staff = []
+    rows = []
+    for employee_id in range(1, employees + 1):
+        staff.append({
+            'id': employee_id,
+            'name': f"Employee{employee_id:04d}",
+            'last_name': rng.choice(['Diallo', 'Traoré', 'Koné', 'Camara', 'Keita', 'Touré']),
+            'hourly_rate': Decimal(rng.randrange(1200, 2600)) / 100,
+        })
+        pattern = rng.choices(patterns, weights)[0]
+        absence, absence_days = None, 0
+
+        day = start
+        while day <= end:
+            weekday = day.weekday()
+            if absence_days == 0 and weekday < 5:
+                if rng.random() < SICK_SPELL_RATE:
+                    absence, absence_days = 'sick', rng.randint(1, 4)
+                elif rng.random() < VACATION_BLOCK_RATE:
+                    absence, absence_days = 'vacation', 5
+
+            if absence_days:
+                rows.append((employee_id, _punch(day, 8 * 60, rng), absence))
+                absence_days -= 1
+            elif (weekday < 5 or (weekday == 5 and rng.random() < SATURDAY_WORK_RATE)
+                  or (weekday == 6 and rng.random() < SUNDAY_WORK_RATE)):
+                rows.extend((employee_id, punch_time, entry_type)
+                            for punch_time, entry_type in _shift_entries(day, pattern, rng))
+            day += timedelta(days=1)
+
+    rows.sort(key=lambda row: (row[1], row[0]))
+    entries = [
+        {'id': entry_id, 'employee_id': employee_id, 'punch_time': pendulum.instance(punch_time),
+         'entry_type': entry_type}
+        for entry_id, (employee_id, punch_time, entry_type) in enumerate(rows, start=1)
+    ]
+    return Workforce(employees=staff, entries=entries, start=start, end=end)
@@ -0,0 +1,149 @@
+"""Live change feed: one LISTEN connection per process, fanned out to every subscriber.
+
+Writes append to change_log and NOTIFY on commit (see database._log_changes). The
+feed reads the new rows once per notification, however many clients are
+subscribed, and hands the batch to each subscriber's queue. Changes held back
+behind an older transaction (see database.ChangePosition) are looked for again
+until they are readable. A subscriber that
+falls too far behind is dropped; its client reconnects with its last change id
+and catches up from the log.
+
+Each batch also brings this worker's clock tracker up to date with the punches
+(database.track_punches). The same connection receives the tables other workers
+write (database.on_tables_changed), so a worker holds one connection outside its
+pool, not two.
+"""
+import asyncio
+import contextlib
+import logging
+from typing import AsyncIterator, Optional
+
+import asyncpg
+
+import database as db
+
+logger = logging.getLogger(__name__)
+
+# Changes read from the log per query
+CHANGE_PAGE_SIZE = 1000
+# Batches queued per subscriber before it is dropped as too slow
+SUBSCRIBER_QUEUE_SIZE = 100
+# Seconds between keepalives sent to idle subscribers
+KEEPALIVE_INTERVAL = 15.0
+# Seconds before reconnecting a lost LISTEN connection
+RECONNECT_DELAY = 1.0
+# Seconds between reads while committed changes are held back
+HELD_BACK_RETRY_INTERVAL = 0.5
+
+def position(change: asyncpg.Record) -> db.ChangePosition:
+    return change['txid'], change['id']
+
+class ChangeFeed:
+    def __init__(self):
+        # Order key of the last change handed to subscribers
+        self.position: db.ChangePosition = (0, 0)
+        self.subscribers: set[asyncio.Queue] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self.position = await db.get_latest_change()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self) -> None:
+        """Keep a LISTEN connection up and publish the changes each notification announces"""
+        reconnecting = False
+        while True:
+            try:
+                conn = await db.db_manager.listen({
+                    db.CHANGE_CHANNEL: lambda *_: self._wakeup.set(),
+                    db.INVALIDATION_CHANNEL: db.on_tables_changed,
+                })
+            except (OSError, asyncpg.PostgresError) as e:
+                logger.error(f"Change feed cannot listen: {e}")
+                await asyncio.sleep(RECONNECT_DELAY)
+                continue
+            conn.add_termination_listener(lambda _: self._wakeup.set())
+            if reconnecting:
+                # Invalidations sent while we were not listening are lost
+                db.tables_changed(*db.TABLE_GROUPS)
+            reconnecting = True
+            try:
+                # Catch up on changes committed while nobody was listening
+                self._wakeup.set()
+                held_back = False
+                while not conn.is_closed():
+                    with contextlib.suppress(asyncio.TimeoutError):
+                        await asyncio.wait_for(self._wakeup.wait(),
+                                               HELD_BACK_RETRY_INTERVAL if held_back else None)
+                    self._wakeup.clear()
+                    await self._publish()
+                    held_back = await db.changes_held_back()
+            except (OSError, asyncpg.PostgresError) as e:
+                logger.error(f"Change feed failed: {e}")
+            finally:
+                if not conn.is_closed():
+                    await conn.close()
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def _publish(self) -> None:
+        while True:
+            changes = await db.get_changes(self.position, CHANGE_PAGE_SIZE)
+            if not changes:
+                return
+            self.position = position(changes[-1])
+            db.track_punches(changes)
+            for queue in list(self.subscribers):
+                try:
+                    queue.put_nowait(changes)
+                except asyncio.QueueFull:
+                    # Too slow: end its stream, the client resumes from the log
+                    self.subscribers.discard(queue)
+                    while not queue.empty():
+                        queue.get_nowait()
+                    queue.put_nowait(None)
+            if len(changes) < CHANGE_PAGE_SIZE:
+                return
+
+    async def subscribe(self, since: Optional[db.ChangePosition] = None) -> AsyncIterator[list]:
+        """Batches of changes after the order key ``since`` (the feed's if None) as they
+        become readable, oldest first; an empty batch every KEEPALIVE_INTERVAL idle seconds"""
+        queue: asyncio.Queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+        self.subscribers.add(queue)
+        try:
+            # Subscribed before reading the backlog, so nothing falls in between;
+            # live batches overlapping the backlog are trimmed by order key
+            last = self.position if since is None else since
+            if since is not None:
+                while True:
+                    changes = await db.get_changes(last, CHANGE_PAGE_SIZE)
+                    if changes:
+                        last = position(changes[-1])
+                        yield changes
+                    if len(changes) < CHANGE_PAGE_SIZE:
+                        break
+            while True:
+                try:
+                    changes = await asyncio.wait_for(queue.get(), KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield []
+                    continue
+                if changes is None:
+                    return
+                changes = [change for change in changes if position(change) > last]
+                if changes:
+                    last = position(changes[-1])
+                    yield changes
+        finally:
+            self.subscribers.discard(queue)
+
+feed = ChangeFeed()
@@ -0,0 +1,123 @@
+"""In-memory clock state behind /api/hours/today and /api/hours/on-site.
+
+"Today" is the UTC day, like the daily_work_summary rows and the timesheet grid
+buckets: the tracker resets at UTC midnight, not at the company's local midnight
+(user_settings.timezone), so its hours always match the stored daily totals.
+"""
+import pendulum
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from typing import Optional
+
+# State key for the company-wide clock (every punch)
+ALL_EMPLOYEES = None
+
+@dataclass
+class ClockState:
+    clocked_in_since: Optional[datetime] = None
+    worked_seconds: float = 0.0
+    entry_count: int = 0
+    last_entry_type: Optional[str] = None
+    last_punch_time: Optional[datetime] = None
+
+    def apply(self, punch_time: datetime, entry_type: str) -> None:
+        """Fold one punch in, pairing in/out like PayrollCalculator.calculate_daily_hours"""
+        if entry_type == 'in':
+            self.clocked_in_since = punch_time
+        elif entry_type == 'out' and self.clocked_in_since:
+            self.worked_seconds += (punch_time - self.clocked_in_since).total_seconds()
+            self.clocked_in_since = None
+        self.entry_count += 1
+        self.last_entry_type = entry_type
+        self.last_punch_time = punch_time
+
+    def total_hours(self, now: datetime) -> float:
+        seconds = self.worked_seconds
+        if self.clocked_in_since:
+            seconds += (now - self.clocked_in_since).total_seconds()
+        return seconds / 3600
+
+class ClockTracker:
+    """In-memory clock state of today's punches per employee, answering in O(1).
+
+    Punches without an employee are tracked under employee_id 0. A punch is applied
+    once by entry id, whether its writer or the change feed brings it first. The
+    tracker is marked stale (and reloaded from the database by its owner) at UTC
+    midnight (see the module docstring) and whenever a punch arrives out of order or today's entries are edited.
+    """
+
+    def __init__(self):
+        self.day: Optional[date] = None
+        self.states: dict[Optional[int], ClockState] = {}
+        # Ids of the entries in the state
+        self.entry_ids: set[int] = set()
+        self.stale = True
+        # Bumped on every change, so a reload racing a write stays stale
+        self.changes = 0
+
+    def needs_reload(self, now: datetime) -> bool:
+        if now.astimezone(timezone.utc).date() != self.day:
+            self.stale = True
+        return self.stale
+
+    def load(self, day: date, entries: list, changes: int) -> None:
+        """Replace the state with today's (entry_id, employee_id, punch_time, entry_type) entries in time order"""
+        self.day = day
+        self.states = {}
+        self.entry_ids = set()
+        for entry in entries:
+            self._apply(*entry)
+        self.stale = changes != self.changes
+
+    def record(self, entry_id: int, employee_id: Optional[int], punch_time: datetime, entry_type: str) -> None:
+        """Apply a newly stored punch, unless it was applied already"""
+        if entry_id in self.entry_ids:
+            return
+        self.changes += 1
+        if self.stale or punch_time.astimezone(timezone.utc).date() != self.day:
+            return
+        for key in (ALL_EMPLOYEES, employee_id or 0):
+            state = self.states.get(key)
+            if state and state.last_punch_time and punch_time < state.last_punch_time:
+                # Back-dated within today: replaying in time order needs a reload
+                self.stale = True
+                return
+        self._apply(entry_id, employee_id, punch_time, entry_type)
+
+    def invalidate_day(self, day: date) -> None:
+        """Mark today's state outdated after entries of that day were edited or removed"""
+        self.changes += 1
+        if day == self.day:
+            self.stale = True
+
+    def _apply(self, entry_id: int, employee_id: Optional[int], punch_time: datetime, entry_type: str) -> None:
+        self.entry_ids.add(entry_id)
+        for key in (ALL_EMPLOYEES, employee_id or 0):
+            self.states.setdefault(key, ClockState()).apply(punch_time, entry_type)
+
+    def today_hours(self, now: datetime, employee_id: Optional[int] = ALL_EMPLOYEES) -> dict:
+        """Get today's hours and status of one employee (0: punches without one) or everyone"""
+        state = self.states.get(employee_id, ClockState())
+        is_clocked_in = state.last_entry_type == 'in'
+        return {
+            'total_hours': state.total_hours(now),
+            'is_clocked_in': is_clocked_in,
+            'clock_in_time': pendulum.instance(state.last_punch_time).format('HH:mm') if is_clocked_in else None,
+            'entry_count': state.entry_count
+        }
+
+    def on_site(self, now: datetime) -> list[dict]:
+        """Get every employee currently clocked in"""
+        return [
+            {
+                'employee_id': employee_id,
+                'clocked_in_since': pendulum.instance(state.last_punch_time).to_iso8601_string(),
+                'total_hours': state.total_hours(now),
+                'entry_count': state.entry_count
+            }
+            for employee_id, state in self.states.items()
+            # Skip the company-wide clock and punches without an employee (0)
+            if employee_id and state.last_entry_type == 'in'
+        ]
+
+tracker = ClockTracker()
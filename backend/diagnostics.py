@@ -0,0 +1,297 @@
+"""Production diagnostics: opt-in request profiles rendered as flamegraphs, and the
+slow query log (see database.SlowQueryLog), both viewable under /api/admin.
+
+A request is profiled when it sends ``X-Profile: 1`` with the ADMIN_TOKEN in
+``X-Admin-Token``, or at random with probability PROFILE_SAMPLE_RATE. A thread
+samples the event loop's stack every PROFILE_INTERVAL_MS while a profiled request
+runs: when another task holds the loop, the sample follows the request's await
+chain instead, so the flamegraph covers its whole wall time, waits included. Tasks
+the request starts (a streamed body, for one) are not followed.
+Requests that are not profiled cost one header scan.
+
+Artifacts are JSON files in DIAGNOSTICS_DIR, shared by the workers; each kind
+keeps its newest entries only.
+"""
+import asyncio
+import hmac
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+from html import escape
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+import orjson
+import pendulum
+
+logger = logging.getLogger(__name__)
+
+# Token of the admin endpoints and of header-requested profiles; unset disables both
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+# Fraction of requests profiled without asking (0 to 1)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# Milliseconds between stack samples of a profiled request
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+# Where the workers keep profiles and slow queries
+DIAGNOSTICS_DIR = Path(os.getenv("DIAGNOSTICS_DIR", "/tmp/payroll-diagnostics"))
+# Entries kept of each kind
+PROFILE_HISTORY = int(os.getenv("PROFILE_HISTORY", "50"))
+SLOW_QUERY_HISTORY = int(os.getenv("SLOW_QUERY_HISTORY", "200"))
+
+# Artifact ids: capture time in nanoseconds and the capturing process
+ARTIFACT_ID = re.compile(r'^\d{19}-\d+$')
+
+FLAMEGRAPH_WIDTH = 1200
+FLAMEGRAPH_ROW_HEIGHT = 17
+
+def new_artifact_id() -> str:
+    return f"{time.time_ns()}-{os.getpid()}"
+
+def is_admin(token: Optional[str]) -> bool:
+    return bool(ADMIN_TOKEN) and token is not None and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+class ArtifactStore:
+    """The newest ``capacity`` JSON records of one kind, one file each.
+
+    Ids sort by capture time, so the directory listing is the ring buffer: every
+    write removes what falls off its end, whichever worker wrote it.
+    """
+
+    def __init__(self, directory: Path, capacity: int):
+        self.directory = directory
+        self.capacity = capacity
+
+    def _ids(self) -> list[str]:
+        if not self.directory.exists():
+            return []
+        return sorted((path.stem for path in self.directory.glob('*.json')), reverse=True)
+
+    def add(self, record: dict[str, Any], artifact_id: Optional[str] = None) -> str:
+        """Store ``record`` under ``artifact_id`` (a new one if None, see new_artifact_id),
+        also set as its 'id', and return the id"""
+        artifact_id = artifact_id or new_artifact_id()
+        record['id'] = artifact_id
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Write-then-rename so readers never see a partial file
+        path = self.directory / f"{artifact_id}.json"
+        temp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        temp_path.write_bytes(orjson.dumps(record, default=str))
+        os.replace(temp_path, path)
+        for stale in self._ids()[self.capacity:]:
+            (self.directory / f"{stale}.json").unlink(missing_ok=True)
+        return artifact_id
+
+    def get(self, artifact_id: str) -> Optional[dict[str, Any]]:
+        if not ARTIFACT_ID.match(artifact_id):
+            return None
+        try:
+            return orjson.loads((self.directory / f"{artifact_id}.json").read_bytes())
+        except FileNotFoundError:
+            return None
+
+    def list(self, limit: Optional[int] = None) -> list[dict[str, Any]]:
+        """Records, newest first"""
+        records = []
+        for artifact_id in self._ids()[:limit]:
+            record = self.get(artifact_id)
+            if record is not None:
+                records.append(record)
+        return records
+
+profiles = ArtifactStore(DIAGNOSTICS_DIR / 'profiles', PROFILE_HISTORY)
+slow_queries = ArtifactStore(DIAGNOSTICS_DIR / 'slow-queries', SLOW_QUERY_HISTORY)
+
+def _frame_label(frame: Any) -> str:
+    code = frame.f_code
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def _awaited_frames(awaitable: Any) -> list:
+    """Frames of a suspended coroutine chain, outermost first"""
+    frames = []
+    while awaitable is not None:
+        frame = (getattr(awaitable, 'cr_frame', None) or getattr(awaitable, 'gi_frame', None)
+                 or getattr(awaitable, 'ag_frame', None))
+        if frame is None:
+            break
+        frames.append(frame)
+        awaitable = (getattr(awaitable, 'cr_await', None) or getattr(awaitable, 'gi_yieldfrom', None)
+                     or getattr(awaitable, 'ag_await', None))
+    return frames
+
+class RequestProfile:
+    """Stack samples of one request's coroutine, as folded stacks and their counts"""
+
+    def __init__(self, scope: dict, coroutine: Any):
+        self.scope = scope
+        self.coroutine = coroutine
+        self.root = f"{scope['method']} {scope['path']}"
+        self.thread_id = threading.get_ident()
+        self.stacks: Counter[str] = Counter()
+        self.started = time.perf_counter()
+        self.status = 500
+
+    def sample(self, frames: dict[int, Any]) -> None:
+        """Record where the request is: running on the loop, or suspended in an await"""
+        marker = self.coroutine.cr_frame
+        if marker is None:
+            return
+        stack = []
+        frame = frames.get(self.thread_id)
+        while frame is not None and frame is not marker:
+            stack.append(frame)
+            frame = frame.f_back
+        if frame is None:
+            # Another task holds the loop: the request waits where its await chain ends
+            labels = [_frame_label(frame) for frame in _awaited_frames(self.coroutine.cr_await)]
+            labels.append('(waiting)')
+        else:
+            labels = [_frame_label(frame) for frame in reversed(stack)]
+        self.stacks[';'.join([self.root, *labels])] += 1
+
+    def record(self) -> dict[str, Any]:
+        return {
+            'captured_at': pendulum.now('UTC').to_iso8601_string(),
+            'method': self.scope['method'],
+            'path': self.scope['path'],
+            'query': self.scope.get('query_string', b'').decode('latin-1'),
+            'status': self.status,
+            'duration_ms': round((time.perf_counter() - self.started) * 1000, 3),
+            'interval_ms': PROFILE_INTERVAL_MS,
+            'samples': sum(self.stacks.values()),
+            'stacks': dict(self.stacks),
+        }
+
+class StackSampler:
+    """One thread per process sampling every active profile; it runs only while there are any"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.active: list[RequestProfile] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, profile: RequestProfile) -> None:
+        with self._lock:
+            self.active.append(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+                self._thread.start()
+
+    def remove(self, profile: RequestProfile) -> None:
+        with self._lock:
+            self.active.remove(profile)
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self.active:
+                    self._thread = None
+                    return
+                active = list(self.active)
+            frames = sys._current_frames()
+            for profile in active:
+                profile.sample(frames)
+
+sampler = StackSampler(PROFILE_INTERVAL_MS / 1000)
+
+def wants_profile(scope: dict) -> bool:
+    if PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+        return True
+    if not ADMIN_TOKEN:
+        return False
+    headers = scope['headers']
+    return (any(name == b'x-profile' and value == b'1' for name, value in headers)
+            and is_admin(next((value.decode('latin-1') for name, value in headers if name == b'x-admin-token'), None)))
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling the requests that ask for it (see wants_profile).
+
+    The response carries the profile's id in ``X-Profile-Id``. It must run in the
+    same task as the endpoint, so it goes inside any BaseHTTPMiddleware.
+    """
+
+    def __init__(self, app: Callable[..., Awaitable[None]]):
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if scope['type'] != 'http' or not wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        profile_id = new_artifact_id()
+
+        async def send_profiled(message: dict) -> None:
+            if message['type'] == 'http.response.start':
+                profile.status = message['status']
+                message['headers'] = [*message.get('headers', ()), (b'x-profile-id', profile_id.encode())]
+            await send(message)
+
+        profile = RequestProfile(scope, self.app(scope, receive, send_profiled))
+        sampler.add(profile)
+        try:
+            await profile.coroutine
+        finally:
+            sampler.remove(profile)
+            try:
+                await asyncio.to_thread(profiles.add, profile.record(), profile_id)
+            except OSError as e:
+                logger.error(f"Cannot save profile {profile_id}: {e}")
+
+def folded_stacks(stacks: dict[str, int]) -> str:
+    """Brendan Gregg's folded format, as read by flamegraph.pl and speedscope"""
+    return ''.join(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
+
+def flamegraph_svg(stacks: dict[str, int], title: str) -> str:
+    """Flame graph of folded stacks: callers below callees, widths proportional to samples"""
+    root: dict[str, Any] = {'count': 0, 'children': {}}
+    depth = 0
+    for stack, count in stacks.items():
+        node = root
+        node['count'] += count
+        frames = stack.split(';')
+        depth = max(depth, len(frames))
+        for name in frames:
+            node = node['children'].setdefault(name, {'count': 0, 'children': {}})
+            node['count'] += count
+
+    total = max(root['count'], 1)
+    height = (depth + 2) * FLAMEGRAPH_ROW_HEIGHT
+    scale = FLAMEGRAPH_WIDTH / total
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{FLAMEGRAPH_WIDTH}" height="{height}" '
+        f'font-family="monospace" font-size="11">',
+        f'<text x="4" y="13">{escape(title)} ({root["count"]} samples)</text>',
+    ]
+
+    def draw(node: dict[str, Any], name: str, x: float, level: int) -> None:
+        width = node['count'] * scale
+        if width < 0.5:
+            return
+        y = height - (level + 1) * FLAMEGRAPH_ROW_HEIGHT
+        # Stable warm colour per function
+        shade = zlib.crc32(name.encode()) % 110
+        label = escape(name)
+        parts.append(f'<g><title>{label} ({node["count"]} samples, {node["count"] * 100 / total:.1f}%)</title>'
+                     f'<rect x="{x:.1f}" y="{y}" width="{width:.1f}" height="{FLAMEGRAPH_ROW_HEIGHT - 1}" '
+                     f'fill="rgb(230,{100 + shade},50)"/>')
+        characters = int(width / 7)
+        if characters > 3:
+            text = name if len(name) <= characters else name[:characters - 2] + '..'
+            parts.append(f'<text x="{x + 3:.1f}" y="{y + 12}">{escape(text)}</text>')
+        parts.append('</g>')
+        for child_name, child in sorted(node['children'].items()):
+            draw(child, child_name, x, level + 1)
+            x += child['count'] * scale
+
+    x = 0.0
+    for name, child in sorted(root['children'].items()):
+        draw(child, name, x, 0)
+        x += child['count'] * scale
+    parts.append('</svg>')
+    return '\n'.join(parts)
@@ -0,0 +1,131 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, AsyncGenerator, AsyncIterable, Union
+
+import serialization
+from serialization import msgpack, pa
+
+# Rows buffered into one chunk of a streamed export
+EXPORT_CHUNK_ROWS = 500
+
+MEDIA_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+# Binary formats, when their optional packages are installed
+if msgpack is not None:
+    MEDIA_TYPES['msgpack'] = serialization.MSGPACK_MEDIA_TYPE
+if pa is not None:
+    MEDIA_TYPES['arrow'] = serialization.ARROW_MEDIA_TYPE
+
+TIME_ENTRY_COLUMNS = ['id', 'employee_id', 'name', 'last_name', 'punch_time', 'entry_type', 'created_at']
+
+PAYROLL_COLUMNS = ['employee_id', 'name', 'last_name', 'period_start', 'period_end',
+                   'regular_hours', 'overtime_hours', 'weekend_hours', 'holiday_hours',
+                   'sick_hours', 'vacation_hours', 'total_hours', 'hourly_rate', 'gross_pay']
+
+# Arrow column types; Decimals stay exact as strings, as in the text formats
+ARROW_TYPES = {
+    'id': 'int32', 'employee_id': 'int32', 'name': 'string', 'last_name': 'string',
+    'punch_time': 'timestamp', 'entry_type': 'string', 'created_at': 'timestamp',
+    'period_start': 'timestamp', 'period_end': 'timestamp',
+}
+
+def export_format(accept: str) -> str:
+    """The export format an Accept header prefers, CSV by default"""
+    formats = {media_type.split(';')[0]: name for name, media_type in MEDIA_TYPES.items()}
+    return formats[serialization.negotiate(accept, list(formats))]
+
+def arrow_schema(columns: list[str]) -> 'pa.Schema':
+    types = {'int32': pa.int32(), 'string': pa.string(), 'timestamp': pa.timestamp('us', tz='UTC')}
+    return pa.schema([(column, types[ARROW_TYPES.get(column, 'string')]) for column in columns])
+
+def export_value(value: Any) -> Any:
+    """Render a value for export; Decimals stay exact as strings"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+async def stream_rows(rows: AsyncIterable[dict], columns: list[str], export_format: str) -> AsyncGenerator[Union[str, bytes], None]:
+    """Render rows as CSV, NDJSON, MessagePack or Arrow, yielding chunks of EXPORT_CHUNK_ROWS rows"""
+    if export_format == 'msgpack':
+        async for chunk in stream_msgpack(rows, columns):
+            yield chunk
+        return
+    if export_format == 'arrow':
+        async for chunk in stream_arrow(rows, columns):
+            yield chunk
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if export_format == 'csv':
+        writer.writerow(columns)
+
+    buffered = 0
+    async for row in rows:
+        values = [export_value(row.get(column)) for column in columns]
+        if export_format == 'csv':
+            writer.writerow(values)
+        else:
+            buffer.write(json.dumps(dict(zip(columns, values))) + '\n')
+
+        buffered += 1
+        if buffered >= EXPORT_CHUNK_ROWS:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            buffered = 0
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+async def stream_msgpack(rows: AsyncIterable[dict], columns: list[str]) -> AsyncGenerator[bytes, None]:
+    """Render rows as a stream of MessagePack maps, the binary counterpart of NDJSON"""
+    packer = msgpack.Packer()
+    chunk = []
+    async for row in rows:
+        chunk.append(packer.pack({column: export_value(row.get(column)) for column in columns}))
+        if len(chunk) >= EXPORT_CHUNK_ROWS:
+            yield b''.join(chunk)
+            chunk = []
+    if chunk:
+        yield b''.join(chunk)
+
+async def stream_arrow(rows: AsyncIterable[dict], columns: list[str]) -> AsyncGenerator[bytes, None]:
+    """Render rows as an Arrow IPC stream, one record batch per EXPORT_CHUNK_ROWS rows"""
+    schema = arrow_schema(columns)
+    sink = io.BytesIO()
+    writer = pa.ipc.new_stream(sink, schema)
+
+    def flush() -> bytes:
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    chunk = []
+    async for row in rows:
+        chunk.append(row)
+        if len(chunk) >= EXPORT_CHUNK_ROWS:
+            writer.write_batch(arrow_batch(chunk, schema))
+            yield flush()
+            chunk = []
+    if chunk:
+        writer.write_batch(arrow_batch(chunk, schema))
+    writer.close()
+    yield flush()
+
+def arrow_batch(rows: list[dict], schema: 'pa.Schema') -> 'pa.RecordBatch':
+    arrays = []
+    for field in schema:
+        values = [row.get(field.name) for row in rows]
+        if field.type == pa.string():
+            values = [None if value is None else str(value) for value in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
@@ -1,25 +1,54 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from contextlib import asynccontextmanager
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
+from datetime import date, datetime
 from typing import Optional, Callable, Any
 import pendulum
 import asyncpg
+import asyncio
+import hashlib
 import logging
+import os
 from functools import wraps
+from dataclasses import asdict, replace
 
 import database as db
-from payroll import PayrollCalculator
+import change_feed
+import clock_tracker
+import diagnostics
+import exports
+import metrics
+import pdf_reports
+import serialization
+from payroll import PayrollCalculator, PayrollCalculation, SNAPSHOT_FIELDS
+from payroll_core import RULE_FIELDS
+from payroll_replay import Scenario, ScenarioResult
+from time_entry_batch import TimeEntryBatch, ENTRY_TYPES
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Bodies of at least this many bytes are gzip-compressed for clients that accept it
+GZIP_MINIMUM_SIZE = int(os.getenv("GZIP_MINIMUM_SIZE", "1024"))
+
 class PunchRequest(BaseModel):
     entry_type: str = Field(..., pattern="^(in|out|sick|vacation)$")
     timestamp: Optional[str] = None
 
+class BulkPunch(BaseModel):
+    employee_id: int = Field(..., gt=0)
+    timestamp: str
+    entry_type: str = Field(..., pattern="^(in|out|sick|vacation)$")
+    client_key: str = Field(..., min_length=1, max_length=100)
+
+class BulkPunchRequest(BaseModel):
+    punches: list[BulkPunch] = Field(..., min_length=1, max_length=10000)
+
 class RateUpdateRequest(BaseModel):
     hourly_rate: float = Field(..., gt=0)
 
@@ -40,18 +69,44 @@ class ConstructionSiteRequest(BaseModel):
 class RoleRequest(BaseModel):
     name: str = Field(..., min_length=1, max_length=100)
 
+class TimesheetCellEdit(BaseModel):
+    employee_id: int = Field(..., gt=0)
+    date: str = Field(..., pattern=r'^\d{4}-\d{2}-\d{2}$')
+    field: str = Field(..., pattern="^(in|out|status|bonus|verified)$")
+    value: Optional[str | bool | float] = None
+
+class TimesheetPatchRequest(BaseModel):
+    edits: list[TimesheetCellEdit] = Field(..., min_length=1)
+
 class PunchResponse(BaseModel):
     success: bool
     message: str
     entry_id: int
     timestamp: str
 
+class BulkPunchResult(BaseModel):
+    client_key: str
+    status: str
+    entry_id: Optional[int] = None
+
+class BulkPunchResponse(BaseModel):
+    created: int
+    duplicates: int
+    rejected: int
+    results: list[BulkPunchResult]
+
 class TodayHoursResponse(BaseModel):
     total_hours: float
     is_clocked_in: bool
     clock_in_time: Optional[str] = None
     entry_count: int
 
+class OnSiteResponse(BaseModel):
+    employee_id: int
+    clocked_in_since: str
+    total_hours: float
+    entry_count: int
+
 class PayrollResponse(BaseModel):
     regular_hours: float
     overtime_hours: float
@@ -64,6 +119,73 @@ class PayrollResponse(BaseModel):
     hourly_rate: float
     period_start: str
     period_end: str
+    from_snapshot: bool = False
+
+class EmployeePayrollResponse(PayrollResponse):
+    employee_id: int
+
+class PayScenario(BaseModel):
+    name: str = Field(..., min_length=1, max_length=100)
+    # Omitted fields keep the current rules
+    overtime_threshold: Optional[float] = Field(None, ge=0, le=24)
+    overtime_multiplier: Optional[float] = Field(None, ge=0)
+    weekend_multiplier: Optional[float] = Field(None, ge=0)
+    holiday_multiplier: Optional[float] = Field(None, ge=0)
+
+class PayRuleSetRequest(BaseModel):
+    name: str = Field(..., min_length=1, max_length=100)
+    overtime_threshold: float = Field(8, ge=0, le=24)
+    overtime_multiplier: float = Field(1.15, ge=0)
+    weekend_multiplier: float = Field(1.5, ge=0)
+    holiday_multiplier: float = Field(2.0, ge=0)
+    sick_multiplier: float = Field(1.0, ge=0)
+    vacation_multiplier: float = Field(1.0, ge=0)
+    absence_hours: float = Field(8, ge=0, le=24)
+    # Weekday numbers, Monday = 0
+    weekend_days: list[int] = Field([5], max_length=7)
+    rest_days: list[int] = Field([6], max_length=7)
+
+class HolidayRequest(BaseModel):
+    date: str = Field(..., pattern=r'^\d{4}-\d{2}-\d{2}$')
+    name: str = Field(..., min_length=1, max_length=200)
+    day_type: str = Field('holiday', pattern="^(workday|weekend|holiday)$")
+
+class WhatIfRequest(BaseModel):
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+    scenarios: list[PayScenario] = Field(..., min_length=1, max_length=50)
+
+class ScenarioPayrollResponse(BaseModel):
+    name: str
+    overtime_threshold: float
+    overtime_multiplier: float
+    weekend_multiplier: float
+    holiday_multiplier: float
+    regular_hours: float
+    overtime_hours: float
+    weekend_hours: float
+    holiday_hours: float
+    sick_hours: float
+    vacation_hours: float
+    total_hours: float
+    gross_pay: float
+    gross_pay_change: float
+
+class WhatIfResponse(BaseModel):
+    period_start: str
+    period_end: str
+    employees: int
+    baseline: ScenarioPayrollResponse
+    scenarios: list[ScenarioPayrollResponse]
+
+async def migrate_time_entry_partitions() -> None:
+    """Drain rows left in the default time_entries partition while serving requests"""
+    try:
+        months = await db.migrate_default_partition()
+        if months:
+            logger.info(f"Moved {months} months of time entries into monthly partitions")
+    except Exception as e:
+        logger.error(f"Time entry partition migration failed: {e}")
 
 # FastAPI 0.116.1 lifespan pattern
 @asynccontextmanager
@@ -74,11 +196,20 @@ async def lifespan(app: FastAPI):
         await db.db_manager.create_pool()
         logger.info("Database pool created successfully")
         
-        await db.init_database()
-        logger.info("Database schema initialized successfully")
+        migrations = await db.init_database()
+        logger.info(f"Database schema up to date (version {db.SCHEMA_VERSION}, {migrations} migrations applied)")
+        
+        await db.ensure_time_entry_partitions()
+        logger.info("Time entry partitions ready")
+        
+        await db.warm_clock_tracker()
+        logger.info("Clock tracker warmed successfully")
         
-        await db.init_default_data()
-        logger.info("Default data initialized successfully")
+        pdf_reports.report_cache.start()
+        logger.info("PDF worker pool started successfully")
+        
+        await change_feed.feed.start()
+        logger.info("Change feed listening")
         
         logger.info("Database initialization completed successfully")
     except Exception as e:
@@ -87,21 +218,31 @@ async def lifespan(app: FastAPI):
             await db.db_manager.close_pool()
         raise e
     
+    partition_migration = asyncio.create_task(migrate_time_entry_partitions())
+    
     yield
     # Shutdown
+    partition_migration.cancel()
+    await change_feed.feed.stop()
+    pdf_reports.report_cache.stop()
     try:
         await db.db_manager.close_pool()
         logger.info("Database pool closed successfully")
     except Exception as e:
         logger.error(f"Error closing database pool: {e}")
+    metrics.process_exiting()
 
 app = FastAPI(
     title="Payroll Time Tracker",
     description="Minimal payroll time tracking API",
     version="0.1.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=serialization.ORJSONResponse
 )
 
+# Innermost, so it runs in the endpoint's task (pool_wait_timing runs the app in a new one)
+app.add_middleware(diagnostics.ProfilingMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173", "http://localhost:3000", "http://localhost:3002"],
@@ -110,6 +251,76 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE)
+
+@app.middleware("http")
+async def pool_wait_timing(request: Request, call_next: Callable) -> Response:
+    """Report the request's connection pool wait as a Server-Timing header"""
+    timer = db.PoolWaitTimer()
+    db.pool_wait.set(timer)
+    response = await call_next(request)
+    response.headers["Server-Timing"] = f"db-pool;dur={timer.seconds * 1000:.3f}"
+    return response
+
+# Outermost, so request latency includes every other middleware
+app.add_middleware(metrics.RequestMetricsMiddleware)
+
+async def entity_tag(request: Request, groups: tuple[str, ...], key: Any = None) -> str:
+    """Strong ETag of a GET: its URL, the headers the body varies on and the versions of the tables it reads"""
+    validator = repr((request.url.path, request.url.query, request.headers.get('accept'),
+                      'gzip' in request.headers.get('accept-encoding', ''), key,
+                      [await db.table_versions.token(group) for group in groups]))
+    return '"%s"' % hashlib.blake2b(validator.encode(), digest_size=16).hexdigest()
+
+def not_modified(request: Request, etag: str) -> bool:
+    """Whether the request's If-None-Match lists the ETag (weak comparison, as RFC 9110 asks)"""
+    header = request.headers.get('if-none-match')
+    if header is None:
+        return False
+    tags = [tag.strip().removeprefix('W/') for tag in header.split(',')]
+    return '*' in tags or etag in tags
+
+def conditional_get(*groups: str, key: Optional[Callable[[], Any]] = None) -> Callable:
+    """Decorator tagging a GET of the given table groups with an ETag.
+    
+    A request whose If-None-Match still matches gets 304 Not Modified before the
+    endpoint runs, so unchanged reloads cost neither the endpoint's query nor the
+    transfer.
+    ``key`` adds what else the body depends on (e.g. the current month). The
+    endpoint must take the request as its ``request`` parameter.
+    """
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            request = kwargs['request']
+            etag = await entity_tag(request, groups, key() if key else None)
+            # no-cache: browsers keep the body but revalidate it on every use
+            headers = {'ETag': etag, 'Cache-Control': 'no-cache', 'Vary': 'Accept'}
+            if not_modified(request, etag):
+                return Response(status_code=304, headers=headers)
+            response = await func(*args, **kwargs)
+            if not isinstance(response, Response):
+                response = serialization.ORJSONResponse(response)
+            response.headers.update(headers)
+            return response
+        return wrapper
+    return decorator
+
+def admin_only(func: Callable) -> Callable:
+    """Decorator answering 403 unless the request carries ADMIN_TOKEN in X-Admin-Token.
+    
+    The endpoint must take the request as its ``request`` parameter.
+    """
+    @wraps(func)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        if not diagnostics.is_admin(kwargs['request'].headers.get('x-admin-token')):
+            raise HTTPException(status_code=403, detail="Admin token required")
+        return await func(*args, **kwargs)
+    return wrapper
+
+def current_month() -> str:
+    return pendulum.now('UTC').format('YYYY-MM')
+
 def prepare_employee_data(employee: EmployeeRequest) -> dict[str, Any]:
     """Convert EmployeeRequest to dict with proper Decimal conversion"""
     data = employee.dict()
@@ -155,11 +366,40 @@ async def punch_clock(request: PunchRequest):
     except (ValueError, pendulum.parsing.ParserError) as e:
         raise HTTPException(status_code=400, detail=f"Invalid request: {str(e)}")
 
+@app.post("/api/punch/bulk", response_model=BulkPunchResponse)
+@handle_errors("Error recording punches")
+async def punch_clock_bulk(request: BulkPunchRequest):
+    """Record a batch of buffered punches; duplicate client keys are skipped, not errors"""
+    punches = [
+        (punch.employee_id, pendulum.parse(punch.timestamp), punch.entry_type, punch.client_key)
+        for punch in request.punches
+    ]
+    
+    results = await db.insert_time_entries_bulk(punches)
+    
+    return BulkPunchResponse(
+        created=sum(1 for status, _ in results if status == 'created'),
+        duplicates=sum(1 for status, _ in results if status == 'duplicate'),
+        rejected=sum(1 for status, _ in results if status == 'unknown_employee'),
+        results=[
+            BulkPunchResult(client_key=punch.client_key, status=status, entry_id=entry_id)
+            for punch, (status, entry_id) in zip(request.punches, results)
+        ]
+    )
+
+async def current_clock_tracker() -> tuple[clock_tracker.ClockTracker, pendulum.DateTime]:
+    """Get the clock tracker, reloading it from the database only after midnight or edits"""
+    now = pendulum.now('UTC')
+    if clock_tracker.tracker.needs_reload(now):
+        await db.warm_clock_tracker(now)
+    return clock_tracker.tracker, now
+
 @app.get("/api/hours/today", response_model=TodayHoursResponse)
-async def get_today_hours():
-    """Get today's work hours and current punch status"""
+async def get_today_hours(employee_id: Optional[int] = None):
+    """Get today's work hours and current punch status, for everyone or one employee"""
     try:
-        hours_data = await PayrollCalculator.get_today_hours()
+        tracker, now = await current_clock_tracker()
+        hours_data = tracker.today_hours(now, employee_id)
         
         return TodayHoursResponse(
             total_hours=hours_data['total_hours'],
@@ -173,38 +413,52 @@ async def get_today_hours():
     except ValueError as e:
         raise HTTPException(status_code=400, detail=f"Invalid date/time parameters: {str(e)}")
 
+@app.get("/api/hours/on-site", response_model=list[OnSiteResponse])
+@handle_errors("Error retrieving on-site employees")
+async def get_on_site():
+    """Get the employees clocked in right now"""
+    tracker, now = await current_clock_tracker()
+    return [OnSiteResponse(**employee) for employee in tracker.on_site(now)]
+
+def parse_period(start_date: Optional[str], end_date: Optional[str]) -> tuple[Optional[pendulum.DateTime], Optional[pendulum.DateTime]]:
+    """Parse optional start/end date query parameters into whole-day bounds"""
+    start_dt = pendulum.parse(start_date).start_of('day') if start_date else None
+    end_dt = pendulum.parse(end_date).end_of('day') if end_date else None
+    return start_dt, end_dt
+
+def payroll_response_fields(calculation: PayrollCalculation) -> dict[str, Any]:
+    """Convert a PayrollCalculation into PayrollResponse fields"""
+    return dict(
+        regular_hours=float(calculation.regular_hours),
+        overtime_hours=float(calculation.overtime_hours),
+        weekend_hours=float(calculation.weekend_hours),
+        holiday_hours=float(calculation.holiday_hours),
+        sick_hours=float(calculation.sick_hours),
+        vacation_hours=float(calculation.vacation_hours),
+        total_hours=float(calculation.total_hours),
+        gross_pay=float(calculation.gross_pay),
+        hourly_rate=float(calculation.hourly_rate),
+        period_start=calculation.period_start.to_iso8601_string(),
+        period_end=calculation.period_end.to_iso8601_string(),
+        from_snapshot=calculation.from_snapshot
+    )
+
 @app.get("/api/payroll/calculate", response_model=PayrollResponse)
 async def calculate_payroll(
     start_date: Optional[str] = None,
-    end_date: Optional[str] = None
+    end_date: Optional[str] = None,
+    engine: Optional[str] = Query(None, pattern="^(python|numpy|summary|sql)$")
 ):
     """Calculate payroll for current 15-day period or specified date range"""
     try:
         # Parse dates if provided
-        start_dt = None
-        end_dt = None
-        
-        if start_date:
-            start_dt = pendulum.parse(start_date).start_of('day')
-        if end_date:
-            end_dt = pendulum.parse(end_date).end_of('day')
+        start_dt, end_dt = parse_period(start_date, end_date)
         
         # Calculate payroll
-        calculation = await PayrollCalculator.calculate_period_pay(start_dt, end_dt)
+        calculation = await PayrollCalculator.calculate_period_pay(start_dt, end_dt, engine)
         
-        return PayrollResponse(
-            regular_hours=float(calculation.regular_hours),
-            overtime_hours=float(calculation.overtime_hours),
-            weekend_hours=float(calculation.weekend_hours),
-            holiday_hours=float(calculation.holiday_hours),
-            sick_hours=float(calculation.sick_hours),
-            vacation_hours=float(calculation.vacation_hours),
-            total_hours=float(calculation.total_hours),
-            gross_pay=float(calculation.gross_pay),
-            hourly_rate=float(calculation.hourly_rate),
-            period_start=calculation.period_start.to_iso8601_string(),
-            period_end=calculation.period_end.to_iso8601_string()
-        )
+        # The fields are already response-shaped; skip re-validating them through the model
+        return serialization.ORJSONResponse(payroll_response_fields(calculation))
     
     except ValueError as e:
         raise HTTPException(status_code=400, detail=f"Invalid date format: {str(e)}")
@@ -213,6 +467,145 @@ async def calculate_payroll(
     except (Decimal.InvalidOperation, ArithmeticError) as e:
         raise HTTPException(status_code=500, detail=f"Calculation error: {str(e)}")
 
+@app.get("/api/payroll/employees", response_model=list[EmployeePayrollResponse])
+async def calculate_employee_payroll(
+    request: Request,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None
+):
+    """Calculate payroll for every employee with entries in the period, at their own rate.
+    
+    JSON by default; MessagePack or Arrow when the Accept header asks for them.
+    """
+    try:
+        start_dt, end_dt = parse_period(start_date, end_date)
+        calculations = await PayrollCalculator.calculate_employee_period_pay(start_dt, end_dt)
+        
+        rows = [
+            dict(employee_id=employee_id, **payroll_response_fields(calculation))
+            for employee_id, calculation in calculations.items()
+        ]
+        return serialization.negotiated_response(request, lambda: rows, lambda: serialization.records_table(rows))
+    
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid date format: {str(e)}")
+    except asyncpg.PostgresError as e:
+        raise HTTPException(status_code=500, detail=f"Database error during calculation: {str(e)}")
+    except ArithmeticError as e:
+        raise HTTPException(status_code=500, detail=f"Calculation error: {str(e)}")
+
+def scenario_response(result: ScenarioResult, baseline_pay: Decimal) -> ScenarioPayrollResponse:
+    return ScenarioPayrollResponse(
+        name=result.name,
+        overtime_threshold=float(result.rules.overtime_threshold),
+        overtime_multiplier=float(result.rules.overtime_multiplier),
+        weekend_multiplier=float(result.rules.weekend_multiplier),
+        holiday_multiplier=float(result.rules.holiday_multiplier),
+        regular_hours=float(result.regular_hours),
+        overtime_hours=float(result.overtime_hours),
+        weekend_hours=float(result.weekend_hours),
+        holiday_hours=float(result.holiday_hours),
+        sick_hours=float(result.sick_hours),
+        vacation_hours=float(result.vacation_hours),
+        total_hours=float(result.total_hours),
+        gross_pay=float(result.gross_pay),
+        gross_pay_change=float(result.gross_pay - baseline_pay)
+    )
+
+@app.post("/api/payroll/what-if", response_model=WhatIfResponse)
+@handle_errors("Error evaluating payroll scenarios")
+async def payroll_what_if(request: WhatIfRequest):
+    """Price a period (defaults to the last 12 months) under alternative multipliers and overtime thresholds.
+    
+    Entries are loaded once per request; every scenario, and the current rules as
+    baseline, is evaluated from the same in-memory day totals.
+    """
+    start_dt, end_dt = parse_period(request.start_date, request.end_date)
+    if end_dt is None:
+        end_dt = pendulum.now('UTC').end_of('day')
+    if start_dt is None:
+        start_dt = end_dt.subtract(years=1).add(days=1).start_of('day')
+    if start_dt > end_dt:
+        raise ValueError("start_date is after end_date")
+    
+    rules = await PayrollCalculator.get_pay_rules()
+    scenarios = [Scenario('baseline', rules)] + [
+        Scenario(scenario.name, replace(rules, **{
+            field: Decimal(str(value))
+            for field, value in scenario.model_dump(exclude={'name'}).items() if value is not None
+        }))
+        for scenario in request.scenarios
+    ]
+    engine = await PayrollCalculator.load_replay(start_dt, end_dt)
+    baseline, *results = engine.evaluate(scenarios)
+    
+    return WhatIfResponse(
+        period_start=start_dt.to_iso8601_string(),
+        period_end=end_dt.to_iso8601_string(),
+        employees=len(engine.employees),
+        baseline=scenario_response(baseline, baseline.gross_pay),
+        scenarios=[scenario_response(result, baseline.gross_pay) for result in results]
+    )
+
+def export_response(request: Request, rows: Any, columns: list[str], export_format: Optional[str],
+                    filename: str) -> StreamingResponse:
+    """Stream rows as an attachment, in ``export_format`` or else the format the Accept header prefers"""
+    if export_format is None:
+        export_format = exports.export_format(request.headers.get('accept'))
+    elif export_format not in exports.MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Export format {export_format} is not available on this server")
+    return StreamingResponse(
+        exports.stream_rows(rows, columns, export_format),
+        media_type=exports.MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{export_format}"'}
+    )
+
+@app.get("/api/export/time-entries")
+async def export_time_entries(
+    request: Request,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson|msgpack|arrow)$")
+):
+    """Stream a period's time entries (defaults to current 15-day period)"""
+    try:
+        start_dt, end_dt = parse_period(start_date, end_date)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid date format: {str(e)}")
+    if start_dt is None or end_dt is None:
+        start_dt, end_dt = PayrollCalculator.get_15_day_period_bounds()
+    
+    rows = db.iter_time_entry_rows(start_dt, end_dt)
+    return export_response(request, rows, exports.TIME_ENTRY_COLUMNS, format,
+                           f"time-entries-{start_dt.to_date_string()}-{end_dt.to_date_string()}")
+
+@app.get("/api/export/payroll")
+async def export_payroll(
+    request: Request,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson|msgpack|arrow)$")
+):
+    """Stream per-employee payroll for a period (defaults to current 15-day period)"""
+    try:
+        start_dt, end_dt = parse_period(start_date, end_date)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid date format: {str(e)}")
+    if start_dt is None or end_dt is None:
+        start_dt, end_dt = PayrollCalculator.get_15_day_period_bounds()
+    
+    rows = (
+        {
+            'employee_id': employee['id'],
+            'name': employee['name'],
+            'last_name': employee['last_name'],
+            **asdict(calculation)
+        }
+        async for employee, calculation in PayrollCalculator.iter_employee_period_pay(start_dt, end_dt)
+    )
+    return export_response(request, rows, exports.PAYROLL_COLUMNS, format,
+                           f"payroll-{start_dt.to_date_string()}-{end_dt.to_date_string()}")
+
 @app.put("/api/settings/rate")
 async def update_rate(request: RateUpdateRequest) -> dict[str, Any]:
     try:
@@ -238,12 +631,27 @@ async def get_current_rate() -> dict[str, float]:
     except asyncpg.PostgresError as e:
         raise HTTPException(status_code=500, detail=f"Database error retrieving rate: {str(e)}")
 
+def calendar_table(batch: TimeEntryBatch) -> Any:
+    """Arrow table of a month's entries, straight from the batch columns"""
+    pa = serialization.pa
+    return pa.table({
+        'id': batch.ids,
+        'punch_time': pa.array(batch.punch_micros, type=pa.timestamp('us', tz='UTC')),
+        'type': pa.DictionaryArray.from_arrays(batch.entry_codes, list(ENTRY_TYPES)),
+    })
+
 @app.get("/api/calendar")
+@conditional_get("time_entries", key=current_month)
 async def get_calendar_data(
+    request: Request,
     year: int = None,
     month: int = None
 ):
-    """Get calendar data with time entries for a specific month"""
+    """Get calendar data with time entries for a specific month.
+    
+    JSON (or MessagePack) entries grouped by day, or with an Arrow Accept header
+    one flat table of (id, punch_time, type) rows.
+    """
     try:
         # Default to current month if not specified
         if year is None or month is None:
@@ -255,36 +663,203 @@ async def get_calendar_data(
         start_of_month = pendulum.datetime(year, month, 1, tz='UTC')
         end_of_month = start_of_month.end_of('month')
         
-        # Get all entries for the month
-        entries = await db.get_time_entries_for_period(start_of_month, end_of_month)
+        # Get all entries for the month, as columns
+        batch = await db.get_time_entry_batch(start_of_month, end_of_month)
         
-        # Group entries by date
-        calendar_data = {}
-        for entry in entries:
-            date_key = entry['punch_time'].date().isoformat()
-            if date_key not in calendar_data:
-                calendar_data[date_key] = []
+        def calendar_content() -> dict[str, Any]:
+            # Group entries by date; each day is a slice of the batch
+            calendar_data = {}
+            for work_date, day in batch.iter_days():
+                calendar_data[work_date.isoformat()] = [
+                    {'id': entry_id, 'time': clock_time, 'type': entry_type}
+                    for entry_id, clock_time, entry_type in zip(day.ids.tolist(), day.clock_times(),
+                                                                day.entry_types())
+                ]
             
-            calendar_data[date_key].append({
-                'id': entry['id'],
-                'time': entry['punch_time'].format('HH:mm'),
-                'type': entry['entry_type']
-            })
+            return {
+                "year": year,
+                "month": month,
+                "entries": calendar_data
+            }
         
-        return {
-            "year": year,
-            "month": month,
-            "entries": calendar_data
-        }
+        return serialization.negotiated_response(request, calendar_content, lambda: calendar_table(batch))
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Calendar error: {str(e)}")
 
+TIMESHEET_STATUSES = {'weekend', 'holiday', 'workholiday', 'sick', 'justified'}
+
+def build_timesheet_grid(rows: list[dict]) -> tuple[list[dict], dict[str, Any]]:
+    """Fold grid rows into the employee list and `<employee>-<day>-<field>` cell map"""
+    employees: dict[int, dict] = {}
+    cells: dict[str, Any] = {}
+    for row in rows:
+        employee_id = row['id']
+        if employee_id not in employees:
+            employees[employee_id] = {
+                key: row[key] for key in ('id', 'name', 'last_name', 'role_id', 'role',
+                                          'construction_site_id', 'construction_site',
+                                          'hourly_rate', 'status', 'fire_date')
+            }
+        if row['work_date'] is None:
+            continue
+        
+        prefix = f"{employee_id}-{row['work_date'].day}-"
+        if row['in_time']:
+            cells[prefix + 'in'] = row['in_time'].strftime('%H:%M')
+        if row['out_time']:
+            cells[prefix + 'out'] = row['out_time'].strftime('%H:%M')
+        status = row['cell_status'] or ('sick' if row['sick'] else 'holiday' if row['vacation'] else None)
+        if status:
+            cells[prefix + 'status'] = status
+        if row['bonus'] is not None:
+            cells[prefix + 'bonus'] = float(row['bonus'])
+        if row['verified']:
+            cells[prefix + 'verified'] = True
+    return list(employees.values()), cells
+
+def parse_cell_time(day: pendulum.Date, value: Any) -> Optional[pendulum.DateTime]:
+    """Turn an `HH:MM` cell value into a UTC punch time on that day (empty clears the cell)"""
+    if value in (None, ''):
+        return None
+    cell_time = datetime.strptime(str(value), '%H:%M')
+    return pendulum.datetime(day.year, day.month, day.day, cell_time.hour, cell_time.minute, tz='UTC')
+
+def parse_cell_bonus(value: Any) -> Optional[Decimal]:
+    """Turn a bonus cell value into a Decimal amount (empty clears the cell)"""
+    if value in (None, ''):
+        return None
+    try:
+        return Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError(f"invalid bonus {value!r}")
+
+@app.get("/api/timesheet")
+@handle_errors("Error retrieving timesheet")
+async def get_timesheet(year: int = None, month: int = None, construction_site_id: Optional[int] = None):
+    """Get the month x employee timesheet grid for one site (or all sites)"""
+    if year is None or month is None:
+        now = pendulum.now('UTC')
+        year = now.year
+        month = now.month
+    
+    start_of_month = pendulum.date(year, month, 1)
+    end_of_month = start_of_month.end_of('month')
+    
+    rows = await db.get_timesheet_grid(start_of_month, end_of_month, construction_site_id)
+    employees, cells = build_timesheet_grid(rows)
+    
+    return {
+        "year": year,
+        "month": month,
+        "construction_site_id": construction_site_id,
+        "employees": employees,
+        "cells": cells
+    }
+
+async def construction_site_name(construction_site_id: Optional[int]) -> str:
+    if construction_site_id is None:
+        return "Tous les chantiers"
+    for site in await db.get_all_construction_sites():
+        if site['id'] == construction_site_id:
+            return site['name']
+    raise HTTPException(status_code=404, detail="Construction site not found")
+
+def pdf_response(path: Any, filename: str) -> FileResponse:
+    return FileResponse(path, media_type="application/pdf", filename=filename)
+
+@app.get("/api/reports/timesheet.pdf")
+@handle_errors("Error rendering timesheet PDF")
+async def get_timesheet_pdf(year: int, month: int = Query(..., ge=1, le=12),
+                            construction_site_id: Optional[int] = None):
+    """Render (or serve the cached) monthly timesheet PDF of one site (or all sites)"""
+    site_name = await construction_site_name(construction_site_id)
+    start_of_month = pendulum.date(year, month, 1)
+    end_of_month = start_of_month.end_of('month')
+    version, _ = await db.get_timesheet_data_version(start_of_month, end_of_month, construction_site_id)
+    
+    async def load() -> tuple:
+        rows = await db.get_timesheet_grid(start_of_month, end_of_month, construction_site_id)
+        employees, cells = build_timesheet_grid(rows)
+        return site_name, year, month, employees, cells
+    
+    prefix = pdf_reports.PdfReportCache.report_prefix('timesheet', construction_site_id, year, month)
+    path = await pdf_reports.report_cache.get(prefix, version, pdf_reports.render_timesheet_pdf, load)
+    return pdf_response(path, f"{prefix.rstrip('-')}.pdf")
+
+@app.get("/api/reports/payroll.pdf")
+@handle_errors("Error rendering payroll PDF")
+async def get_payroll_pdf(year: int, month: int = Query(..., ge=1, le=12),
+                          construction_site_id: Optional[int] = None):
+    """Render (or serve the cached) monthly per-employee payroll PDF of one site (or all sites)"""
+    site_name = await construction_site_name(construction_site_id)
+    start_dt = pendulum.datetime(year, month, 1, tz='UTC')
+    end_dt = start_dt.end_of('month')
+    version, has_open_shift = await db.get_timesheet_data_version(start_dt.date(), end_dt.date(),
+                                                                  construction_site_id)
+    version += '-' + (await PayrollCalculator.get_pay_rules()).version
+    if has_open_shift:
+        # Open shifts are paid up to now, so the file only holds for the current minute
+        version += pendulum.now('UTC').format('-YYYYMMDDHHmm')
+    
+    async def load() -> tuple:
+        payroll = [
+            {'name': employee['name'], 'last_name': employee['last_name'],
+             **{field: getattr(calculation, field) for field in SNAPSHOT_FIELDS}}
+            async for employee, calculation in PayrollCalculator.iter_employee_period_pay(
+                start_dt, end_dt, construction_site_id)
+        ]
+        payroll.sort(key=lambda line: (line['name'], line['last_name']))
+        return site_name, year, month, payroll
+    
+    prefix = pdf_reports.PdfReportCache.report_prefix('payroll', construction_site_id, year, month)
+    path = await pdf_reports.report_cache.get(prefix, version, pdf_reports.render_payroll_pdf, load)
+    return pdf_response(path, f"{prefix.rstrip('-')}.pdf")
+
+@app.get("/api/reports/stats")
+async def get_report_stats() -> dict[str, Any]:
+    """Hit/render counters of the PDF report cache"""
+    return pdf_reports.report_cache.stats()
+
+@app.patch("/api/timesheet")
+@handle_errors("Error saving timesheet")
+async def patch_timesheet(request: TimesheetPatchRequest) -> dict[str, Any]:
+    """Save a batch of timesheet cell edits; later edits of the same cell win"""
+    punches: dict[tuple, Optional[pendulum.DateTime]] = {}
+    statuses: dict[tuple, Optional[str]] = {}
+    bonuses: dict[tuple, Optional[Decimal]] = {}
+    verified: dict[tuple, bool] = {}
+    
+    for edit in request.edits:
+        day = pendulum.parse(edit.date).date()
+        key = (edit.employee_id, day)
+        
+        if edit.field in ('in', 'out'):
+            punches[(edit.employee_id, day, edit.field)] = parse_cell_time(day, edit.value)
+        elif edit.field == 'status':
+            if edit.value not in (None, '') and edit.value not in TIMESHEET_STATUSES:
+                raise ValueError(f"unknown status {edit.value!r}")
+            statuses[key] = edit.value or None
+        elif edit.field == 'bonus':
+            bonuses[key] = parse_cell_bonus(edit.value)
+        else:
+            # A JSON boolean only: bool("false") would verify the day
+            if not isinstance(edit.value, bool):
+                raise ValueError(f"verified must be true or false, not {edit.value!r}")
+            verified[key] = edit.value
+    
+    cells_written = await db.apply_timesheet_edits(punches, statuses, bonuses, verified)
+    return {"success": True, "cells_written": cells_written}
+
 # Employee management endpoints
 @app.get("/api/employees")
 @handle_errors("Error retrieving employees")
-async def get_employees():
-    return await db.get_all_employees()
+@conditional_get("employees")
+async def get_employees(request: Request):
+    """List employees: JSON by default, MessagePack or Arrow when the Accept header asks for them"""
+    employees = await db.get_all_employees()
+    return serialization.negotiated_response(request, lambda: employees,
+                                             lambda: serialization.records_table(employees))
 
 @app.post("/api/employees")
 @handle_errors("Error creating employee")
@@ -337,7 +912,8 @@ async def hire_employee(employee_id: int):
 # Construction Sites endpoints
 @app.get("/api/construction-sites")
 @handle_errors("Error retrieving construction sites")
-async def get_construction_sites():
+@conditional_get("construction_sites")
+async def get_construction_sites(request: Request):
     return await db.get_all_construction_sites()
 
 @app.post("/api/construction-sites")
@@ -371,7 +947,8 @@ async def delete_construction_site(site_id: int):
 # Roles API endpoints
 @app.get("/api/roles")
 @handle_errors("Error retrieving roles")
-async def get_roles():
+@conditional_get("roles")
+async def get_roles(request: Request):
     return await db.get_all_roles()
 
 @app.post("/api/roles")
@@ -404,6 +981,167 @@ async def delete_role(role_id: int):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error deleting role: {str(e)}")
 
+def pay_rule_set_fields(rule_set: PayRuleSetRequest) -> dict[str, Any]:
+    """Convert a PayRuleSetRequest into pay_rule_sets columns"""
+    for day in rule_set.weekend_days + rule_set.rest_days:
+        if not 0 <= day <= 6:
+            raise ValueError(f"weekday {day} is not between 0 (Monday) and 6 (Sunday)")
+    fields = {name: Decimal(str(getattr(rule_set, name))) for name in RULE_FIELDS}
+    return dict(fields, weekend_days=sorted(set(rule_set.weekend_days)), rest_days=sorted(set(rule_set.rest_days)))
+
+@app.get("/api/pay-rules")
+@handle_errors("Error retrieving pay rules")
+@conditional_get("pay_rules")
+async def get_pay_rules(request: Request):
+    """List pay rule sets, the active one first"""
+    return await db.get_pay_rule_sets()
+
+@app.post("/api/pay-rules")
+@handle_errors("Error creating pay rule set")
+async def create_pay_rule_set(rule_set: PayRuleSetRequest) -> dict[str, Any]:
+    rule_set_id = await db.create_pay_rule_set(rule_set.name, **pay_rule_set_fields(rule_set))
+    return {"success": True, "rule_set_id": rule_set_id, "message": "Pay rule set created successfully"}
+
+@app.put("/api/pay-rules/{rule_set_id}")
+@handle_errors("Error updating pay rule set")
+async def update_pay_rule_set(rule_set_id: int, rule_set: PayRuleSetRequest):
+    if not await db.update_pay_rule_set(rule_set_id, rule_set.name, **pay_rule_set_fields(rule_set)):
+        raise HTTPException(status_code=404, detail="Pay rule set not found")
+    return {"success": True, "message": "Pay rule set updated successfully"}
+
+@app.post("/api/pay-rules/{rule_set_id}/activate")
+@handle_errors("Error activating pay rule set")
+async def activate_pay_rule_set(rule_set_id: int):
+    """Calculate payroll with this rule set from now on"""
+    if not await db.activate_pay_rule_set(rule_set_id):
+        raise HTTPException(status_code=404, detail="Pay rule set not found")
+    return {"success": True, "message": "Pay rule set activated successfully"}
+
+@app.get("/api/holidays")
+@handle_errors("Error retrieving holidays")
+@conditional_get("pay_rules")
+async def get_holidays(request: Request, year: Optional[int] = None):
+    return await db.get_holidays(year)
+
+@app.put("/api/holidays")
+@handle_errors("Error saving holiday")
+async def save_holiday(holiday: HolidayRequest):
+    """Add or replace the day type of one date (a public holiday by default)"""
+    await db.upsert_holiday(date.fromisoformat(holiday.date), holiday.name, holiday.day_type)
+    return {"success": True, "message": "Holiday saved successfully"}
+
+@app.delete("/api/holidays/{holiday_date}")
+@handle_errors("Error deleting holiday")
+async def delete_holiday(holiday_date: str):
+    if not await db.delete_holiday(date.fromisoformat(holiday_date)):
+        raise HTTPException(status_code=404, detail="Holiday not found")
+    return {"success": True, "message": "Holiday deleted successfully"}
+
+class ChangeResponse(BaseModel):
+    id: int
+    entity: str
+    entity_id: Optional[int] = None
+    action: str
+    data: Optional[dict[str, Any]] = None
+    changed_at: datetime
+
+class ChangesResponse(BaseModel):
+    cursor: int
+    changes: list[ChangeResponse]
+    more: bool
+
+async def change_position(since: int) -> db.ChangePosition:
+    """Order key of a client's cursor; 410 Gone when changes after it were pruned
+    from the log: the client must reload"""
+    position = await db.get_change_position(since)
+    if position is None:
+        raise HTTPException(status_code=410, detail="Changes since this cursor were pruned; reload and sync again")
+    return position
+
+@app.get("/api/changes", response_model=ChangesResponse)
+@handle_errors("Error retrieving changes")
+async def get_changes(since: Optional[int] = Query(None, ge=0), limit: int = Query(1000, ge=1, le=10000)):
+    """Changes after the ``since`` cursor, oldest first, for delta sync.
+    
+    Without ``since`` only the current cursor is returned: load the data, then
+    ask for the changes since that cursor. ``more`` means another page is waiting.
+    """
+    if since is None:
+        _, latest = await db.get_latest_change()
+        return {"cursor": latest, "changes": [], "more": False}
+    changes = await db.get_changes(await change_position(since), limit)
+    return {
+        "cursor": changes[-1]['id'] if changes else since,
+        "changes": [dict(change) for change in changes],
+        "more": len(changes) == limit
+    }
+
+def change_event(change: Any) -> bytes:
+    """One change as a server-sent event; its id lets EventSource resume with Last-Event-ID"""
+    data = {field: change[field] for field in ChangeResponse.model_fields}
+    return b"id: %d\nevent: change\ndata: %s\n\n" % (change['id'], serialization.encode_json(data))
+
+@app.get("/api/changes/stream")
+@handle_errors("Error streaming changes")
+async def stream_changes(request: Request, since: Optional[int] = Query(None, ge=0)):
+    """Server-sent events of changes as they are committed (after ``since``, or the
+    Last-Event-ID of a reconnecting EventSource, when given)"""
+    last_event_id = request.headers.get('last-event-id', '')
+    if last_event_id.isdigit():
+        since = int(last_event_id)
+    position = await change_position(since) if since is not None else None
+    
+    async def events() -> Any:
+        async for changes in change_feed.feed.subscribe(position):
+            if not changes:
+                yield b": keepalive\n\n"
+            for change in changes:
+                yield change_event(change)
+    
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/api/cache/stats")
+async def get_cache_stats() -> dict[str, Any]:
+    """Hit/miss counters of the reference data cache"""
+    return db.reference_cache.stats()
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics() -> Response:
+    """Prometheus metrics of every worker (see metrics.py)"""
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE_LATEST)
+
+@app.get("/api/admin/profiles")
+@admin_only
+async def list_profiles(request: Request, limit: int = Query(50, ge=1)) -> list[dict[str, Any]]:
+    """Captured request profiles, newest first, without their stacks"""
+    records = await asyncio.to_thread(diagnostics.profiles.list, limit)
+    for record in records:
+        del record['stacks']
+    return records
+
+@app.get("/api/admin/profiles/{profile_id}")
+@admin_only
+async def get_profile(request: Request, profile_id: str,
+                      format: str = Query('svg', pattern="^(svg|folded|json)$")) -> Response:
+    """A request profile as a flamegraph SVG, folded stacks (flamegraph.pl, speedscope) or JSON"""
+    profile = await asyncio.to_thread(diagnostics.profiles.get, profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == 'json':
+        return serialization.ORJSONResponse(profile)
+    if format == 'folded':
+        return Response(diagnostics.folded_stacks(profile['stacks']), media_type="text/plain")
+    url = f"{profile['path']}?{profile['query']}" if profile['query'] else profile['path']
+    title = f"{profile['method']} {url} {profile['duration_ms']} ms"
+    return Response(diagnostics.flamegraph_svg(profile['stacks'], title), media_type="image/svg+xml")
+
+@app.get("/api/admin/slow-queries")
+@admin_only
+async def list_slow_queries(request: Request, limit: int = Query(50, ge=1)) -> list[dict[str, Any]]:
+    """Queries over SLOW_QUERY_MS with their parameters and plans, newest first"""
+    return await asyncio.to_thread(diagnostics.slow_queries.list, limit)
+
 # Health check endpoint
 @app.get("/health")
 async def health_check() -> dict[str, str]:
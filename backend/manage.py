@@ -0,0 +1,69 @@
+import argparse
+import asyncio
+import logging
+import pendulum
+from datetime import date
+
+import database as db
+import partitions
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+async def migrate(args: argparse.Namespace) -> None:
+    """Apply pending schema migrations (e.g. before a rolling restart)"""
+    applied = await db.init_database()
+    logger.info(f"Schema at version {db.SCHEMA_VERSION}, {applied} migrations applied")
+
+async def rebuild_summary(args: argparse.Namespace) -> None:
+    """Recompute the daily_work_summary rollup from time_entries"""
+    rows = await db.rebuild_daily_work_summary()
+    logger.info(f"Rebuilt daily work summary: {rows} rows")
+
+async def create_partitions(args: argparse.Namespace) -> None:
+    """Create time_entries partitions ahead and move rows out of the default partition"""
+    await db.ensure_time_entry_partitions()
+    months = await db.migrate_default_partition()
+    logger.info(f"Partitions ready, moved {months} months out of the default partition")
+
+async def detach_month(args: argparse.Namespace) -> None:
+    """Detach an old month of time_entries into a standalone archive table.
+    
+    The daily rollup keeps that month's totals; raw entries leave every query.
+    """
+    if not args.month:
+        raise SystemExit("detach-month needs a month (YYYY-MM)")
+    year, month = map(int, args.month.split("-"))
+    async with db.db_manager.get_connection() as conn:
+        archive = await partitions.detach_month(conn, date(year, month, 1))
+    logger.info(f"Detached {args.month} into {archive}")
+
+async def prune_changes(args: argparse.Namespace) -> None:
+    """Delete change_log rows older than CHANGE_LOG_RETENTION_DAYS.
+    
+    Clients still syncing from before the cut get 410 Gone and reload.
+    """
+    deleted = await db.prune_change_log(pendulum.now('UTC').subtract(days=db.CHANGE_LOG_RETENTION_DAYS))
+    logger.info(f"Pruned {deleted} changes older than {db.CHANGE_LOG_RETENTION_DAYS} days")
+
+COMMANDS = {
+    "migrate": migrate,
+    "rebuild-summary": rebuild_summary,
+    "create-partitions": create_partitions,
+    "detach-month": detach_month,
+    "prune-changes": prune_changes,
+}
+
+async def run(args: argparse.Namespace) -> None:
+    await db.db_manager.create_pool()
+    try:
+        await COMMANDS[args.command](args)
+    finally:
+        await db.db_manager.close_pool()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Payroll backend maintenance commands")
+    parser.add_argument("command", choices=COMMANDS.keys())
+    parser.add_argument("month", nargs="?", help="YYYY-MM, for detach-month")
+    args = parser.parse_args()
+    asyncio.run(run(args))
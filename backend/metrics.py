@@ -0,0 +1,110 @@
+"""Prometheus metrics: request latency by route, query time and rows by statement name,
+connection pool usage and payroll stage timings, served at /metrics.
+
+An observation is a bucket search and two additions, a few microseconds, so the
+metrics stay on under load. Under serve.py every worker writes its samples to
+PROMETHEUS_MULTIPROC_DIR and a scrape of any one worker reports them all.
+"""
+import os
+import time
+from typing import Any, Awaitable, Callable
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Gauge, Histogram,
+                               generate_latest, multiprocess)
+
+# Set for multi-worker serving (serve.py): where each process keeps its samples
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# Seconds, from a cached reference read to a large export
+LATENCY_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Seconds spent waiting for a pooled connection: zero unless the pool is exhausted
+POOL_WAIT_BUCKETS = (.0001, .0005, .001, .005, .01, .05, .1, .5, 1.0, 5.0)
+# Rows returned or affected by one query
+ROW_BUCKETS = (0, 1, 10, 100, 1_000, 10_000, 100_000, 1_000_000)
+
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'HTTP requests by route template, until the last body byte',
+    ['method', 'route', 'status'], buckets=LATENCY_BUCKETS)
+QUERY_DURATION = Histogram(
+    'db_query_duration_seconds', 'Queries by statement name (database.statement); other for the rest',
+    ['query'], buckets=LATENCY_BUCKETS)
+QUERY_ROWS = Histogram(
+    'db_query_rows', 'Rows returned or affected by queries, by statement name',
+    ['query'], buckets=ROW_BUCKETS)
+POOL_ACQUIRE_WAIT = Histogram(
+    'db_pool_acquire_wait_seconds', 'Time spent waiting for a pooled connection',
+    buckets=POOL_WAIT_BUCKETS)
+POOL_CONNECTIONS = Gauge(
+    'db_pool_connections', 'Pooled connections in use or idle',
+    ['state'], multiprocess_mode='livesum')
+POOL_MAX_CONNECTIONS = Gauge(
+    'db_pool_max_connections', 'Pool size limit', multiprocess_mode='livesum')
+PAYROLL_STAGE_DURATION = Histogram(
+    'payroll_stage_duration_seconds', 'Period payroll by engine and stage (fetch, group, compute)',
+    ['engine', 'stage'], buckets=LATENCY_BUCKETS)
+
+POOL_IN_USE = POOL_CONNECTIONS.labels('in_use')
+POOL_IDLE = POOL_CONNECTIONS.labels('idle')
+
+# (duration, rows) series by statement name; labels() locks and builds a key on every call
+_query_series: dict[str, tuple[Any, Any]] = {}
+
+def observe_query(name: str, seconds: float, rows: int = None) -> None:
+    """Record one query; rows is None when the driver does not report them (executemany)"""
+    series = _query_series.get(name)
+    if series is None:
+        series = _query_series[name] = (QUERY_DURATION.labels(name), QUERY_ROWS.labels(name))
+    series[0].observe(seconds)
+    if rows is not None:
+        series[1].observe(rows)
+
+def observe_pool(size: int, idle: int) -> None:
+    POOL_IN_USE.set(size - idle)
+    POOL_IDLE.set(idle)
+
+class RequestMetricsMiddleware:
+    """ASGI middleware timing every HTTP request by its route template.
+
+    Event streams are left out: their duration is how long the client stayed.
+    """
+
+    def __init__(self, app: Callable[..., Awaitable[None]]):
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+        streaming = False
+
+        async def send_timed(message: dict) -> None:
+            nonlocal status, streaming
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                streaming = any(name == b'content-type' and value.startswith(b'text/event-stream')
+                                for name, value in message.get('headers', ()))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            if not streaming:
+                # The router stores the matched route in the scope
+                route = scope.get('route')
+                REQUEST_DURATION.labels(scope['method'], getattr(route, 'path', 'unmatched'),
+                                        str(status)).observe(time.perf_counter() - started)
+
+def render() -> bytes:
+    """Text exposition of this process's metrics, or of every worker's under serve.py"""
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+def process_exiting() -> None:
+    """Drop this worker's pool gauges from the aggregate once it stops"""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,159 @@
+import logging
+import os
+import re
+from datetime import date
+from typing import Iterable
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+# Months of time_entries partitions kept ready past the current month
+PARTITION_MONTHS_AHEAD = int(os.getenv('PARTITION_MONTHS_AHEAD', '3'))
+
+# Catches punches outside every monthly partition; holds the old rows right after a
+# plain time_entries table is converted, until they are moved into their months
+DEFAULT_PARTITION = 'time_entries_default'
+
+# Advisory lock key serializing partition DDL across workers
+PARTITION_LOCK_KEY = 7_301_001
+
+ENTRY_TYPE_CHECK = "CHECK (entry_type IN ('in', 'out', 'sick', 'vacation'))"
+
+TIME_ENTRY_COLUMNS = 'id, employee_id, punch_time, entry_type, client_key, created_at'
+
+_PARTITION_NAME = re.compile(r'^time_entries_(\d{4})_(\d{2})$')
+
+def month_of(day: date) -> date:
+    return date(day.year, day.month, 1)
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(month: date) -> str:
+    return f"time_entries_{month:%Y_%m}"
+
+def _bound(month: date) -> str:
+    return f"'{month.isoformat()} 00:00:00+00'"
+
+async def is_partitioned(conn: asyncpg.Connection) -> bool:
+    return await conn.fetchval("""
+        SELECT relkind = 'p' FROM pg_class WHERE oid = 'time_entries'::regclass
+    """)
+
+async def convert_legacy_table(conn: asyncpg.Connection) -> bool:
+    """Turn a plain time_entries table into the partitioned layout, without copying.
+
+    The old table is renamed and attached as the default partition, so it stays
+    readable and writable until its rows are moved into monthly partitions.
+    Must run before the partitioned indexes are created. Returns whether it converted.
+    """
+    if await is_partitioned(conn):
+        return False
+
+    logger.info("Converting time_entries to a monthly partitioned table")
+    # ATTACH wants the CHECK constraint under the parent's name and expression, so it
+    # is re-added here in exactly the form the parent declares it
+    await conn.execute(f"""
+        ALTER TABLE time_entries RENAME TO {DEFAULT_PARTITION};
+        ALTER TABLE {DEFAULT_PARTITION}
+            DROP CONSTRAINT time_entries_pkey,
+            DROP CONSTRAINT IF EXISTS time_entries_entry_type_check,
+            ADD CONSTRAINT time_entries_entry_type_check {ENTRY_TYPE_CHECK};
+        DROP INDEX IF EXISTS idx_time_entries_punch_time;
+        DROP INDEX IF EXISTS idx_time_entries_employee;
+        DROP INDEX IF EXISTS idx_time_entries_client_key;
+
+        CREATE TABLE time_entries (
+            id INTEGER NOT NULL DEFAULT nextval('time_entries_id_seq'),
+            employee_id INTEGER,
+            punch_time TIMESTAMPTZ NOT NULL,
+            entry_type VARCHAR(10) NOT NULL,
+            client_key VARCHAR(100),
+            created_at TIMESTAMPTZ DEFAULT NOW(),
+            PRIMARY KEY (id, punch_time),
+            -- Same names as the old table's constraints, which ATTACH matches by name
+            CONSTRAINT time_entries_employee_id_fkey
+                FOREIGN KEY (employee_id) REFERENCES employees(id) ON DELETE CASCADE,
+            CONSTRAINT time_entries_entry_type_check {ENTRY_TYPE_CHECK}
+        ) PARTITION BY RANGE (punch_time);
+        ALTER SEQUENCE time_entries_id_seq OWNED BY time_entries.id;
+
+        ALTER TABLE time_entries ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT;
+    """)
+    return True
+
+async def existing_months(conn: asyncpg.Connection) -> set[date]:
+    """Get the months that have a partition attached"""
+    names = await conn.fetch("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'time_entries'::regclass
+    """)
+    months = set()
+    for record in names:
+        match = _PARTITION_NAME.match(record['relname'])
+        if match:
+            months.add(date(int(match.group(1)), int(match.group(2)), 1))
+    return months
+
+async def create_month_partition(conn: asyncpg.Connection, month: date) -> None:
+    """Create and attach one month's partition, taking over its rows from the default partition.
+
+    The partition is filled while still detached and carries a CHECK matching its
+    bounds, so ATTACH neither scans it nor blocks writes to time_entries.
+    Call inside a transaction.
+    """
+    name = partition_name(month)
+    start, end = _bound(month), _bound(add_months(month, 1))
+    await conn.execute(f"""
+        CREATE TABLE {name} (LIKE time_entries INCLUDING DEFAULTS INCLUDING CONSTRAINTS);
+        ALTER TABLE {name} ADD CONSTRAINT {name}_bounds
+            CHECK (punch_time >= {start} AND punch_time < {end});
+
+        WITH moved AS (
+            DELETE FROM {DEFAULT_PARTITION}
+            WHERE punch_time >= {start} AND punch_time < {end}
+            RETURNING {TIME_ENTRY_COLUMNS}
+        )
+        INSERT INTO {name} ({TIME_ENTRY_COLUMNS})
+        SELECT {TIME_ENTRY_COLUMNS} FROM moved;
+
+        ALTER TABLE time_entries ATTACH PARTITION {name} FOR VALUES FROM ({start}) TO ({end});
+        ALTER TABLE {name} DROP CONSTRAINT {name}_bounds;
+    """)
+    logger.info(f"Created partition {name}")
+
+async def ensure_months(conn: asyncpg.Connection, months: Iterable[date]) -> set[date]:
+    """Create any missing partitions for the given months; returns every month now covered.
+
+    Call inside a transaction: the advisory lock keeps concurrent workers from
+    racing on the same month.
+    """
+    await conn.execute("SELECT pg_advisory_xact_lock($1)", PARTITION_LOCK_KEY)
+    existing = await existing_months(conn)
+    for month in sorted(set(months) - existing):
+        await create_month_partition(conn, month)
+        existing.add(month)
+    return existing
+
+async def default_partition_months(conn: asyncpg.Connection) -> list[date]:
+    """Get the months that still have rows in the default partition"""
+    records = await conn.fetch(f"""
+        SELECT DISTINCT date_trunc('month', punch_time AT TIME ZONE 'UTC')::date AS month
+        FROM {DEFAULT_PARTITION}
+        ORDER BY month
+    """)
+    return [record['month'] for record in records]
+
+async def detach_month(conn: asyncpg.Connection, month: date) -> str:
+    """Detach one month's partition and keep it as a standalone archive table"""
+    name = partition_name(month)
+    archive = f"time_entries_archive_{month:%Y_%m}"
+    await conn.execute(f"""
+        ALTER TABLE time_entries DETACH PARTITION {name};
+        ALTER TABLE {name} RENAME TO {archive};
+    """)
+    return archive
@@ -1,59 +1,48 @@
+import os
 import pendulum
+import numpy as np
 from decimal import Decimal
-from typing import Optional
-from dataclasses import dataclass
-from database import get_time_entries_for_period, get_current_hourly_rate
+from typing import Optional, Iterable, AsyncGenerator
+from database import (get_time_entry_batch, get_current_hourly_rate, get_daily_summaries_for_period,
+                      iter_employee_daily_summaries, get_payroll_snapshots,
+                      save_payroll_snapshots, get_payroll_inputs_version, get_all_employees,
+                      get_pay_rule_config, get_daily_hours_for_period)
+import metrics
+import payroll_core
+import payroll_vectorized
+from payroll_core import PayrollCalculation, PayRules, DEFAULT_RULES
+from payroll_replay import ReplayEngine
+from time_entry_batch import TimeEntryBatch, epoch_micros
 
-@dataclass
-class PayrollCalculation:
-    regular_hours: Decimal
-    overtime_hours: Decimal
-    weekend_hours: Decimal
-    holiday_hours: Decimal
-    sick_hours: Decimal
-    vacation_hours: Decimal
-    total_hours: Decimal
-    gross_pay: Decimal
-    hourly_rate: Decimal
-    period_start: pendulum.DateTime
-    period_end: pendulum.DateTime
+# Calculation engine used by calculate_period_pay: 'python' (per entry), 'numpy' (punches
+# paired and bucketed by day in NumPy, then tallied per day like python), 'summary'
+# (daily_work_summary rollup, punches paired per employee) or 'sql' (punches paired in
+# SQL, with the same UTC days and pairing as python)
+PAYROLL_ENGINE = os.getenv("PAYROLL_ENGINE", "python")
+
+EPOCH_DATE = pendulum.date(1970, 1, 1)
+
+# PayrollCalculation fields persisted in payroll_snapshots
+SNAPSHOT_FIELDS = ('regular_hours', 'overtime_hours', 'weekend_hours', 'holiday_hours', 'sick_hours',
+                   'vacation_hours', 'total_hours', 'gross_pay', 'hourly_rate')
 
 class PayrollCalculator:
     """Business logic for payroll calculations using Pendulum for precise datetime handling"""
     
-    @staticmethod
-    def is_weekend(date: pendulum.Date) -> bool:
-        """Check if date is weekend (Saturday=5, Sunday=6)"""
-        return date.weekday() in [5, 6]
+    is_weekend = staticmethod(payroll_core.is_weekend)
+    is_holiday = staticmethod(payroll_core.is_holiday)
+    calculate_daily_hours = staticmethod(payroll_core.calculate_daily_hours)
     
-    @staticmethod
-    def is_holiday(date: pendulum.Date) -> bool:
-        """Check if date is Sunday (holiday with 2x rate)"""
-        return date.weekday() == 6
+    # (configuration, PayRules compiled from it) of the last get_pay_rules call
+    _compiled_rules: tuple[Optional[dict], PayRules] = (None, DEFAULT_RULES)
     
-    @staticmethod
-    def calculate_daily_hours(entries: list[dict], current_time: pendulum.DateTime = None) -> Decimal:
-        """Calculate work hours for a single day from punch entries"""
-        if current_time is None:
-            current_time = pendulum.now('UTC')
-            
-        total_seconds = Decimal('0')
-        in_time = None
-        
-        for entry in entries:
-            if entry['entry_type'] == 'in':
-                in_time = entry['punch_time']
-            elif entry['entry_type'] == 'out' and in_time:
-                duration = entry['punch_time'] - in_time
-                total_seconds += Decimal(str(duration.total_seconds()))
-                in_time = None
-        
-        # If still clocked in, calculate until current_time
-        if in_time:
-            duration = current_time - in_time
-            total_seconds += Decimal(str(duration.total_seconds()))
-        
-        return total_seconds / Decimal('3600')  # Convert to hours
+    @classmethod
+    async def get_pay_rules(cls) -> PayRules:
+        """Get the active pay rules; the day-type calendar is rebuilt only when the rules changed"""
+        config = await get_pay_rule_config()
+        if config != cls._compiled_rules[0]:
+            cls._compiled_rules = (config, payroll_core.compile_pay_rules(config['rule_set'], config['holidays']))
+        return cls._compiled_rules[1]
     
     @staticmethod
     def get_15_day_period_bounds(reference_date: pendulum.Date = None) -> tuple[pendulum.DateTime, pendulum.DateTime]:
@@ -74,13 +63,7 @@ class PayrollCalculator:
     @classmethod
     def _group_entries_by_date(cls, entries: list[dict]) -> dict[str, list]:
         """Group time entries by date"""
-        daily_entries: dict[str, list] = {}
-        for entry in entries:
-            date_key = entry['punch_time'].date().isoformat()
-            if date_key not in daily_entries:
-                daily_entries[date_key] = []
-            daily_entries[date_key].append(entry)
-        return daily_entries
+        return payroll_core.group_entries_by_date(entries)
     
     @classmethod
     def _calculate_gross_pay(cls, regular_hours: Decimal, overtime_hours: Decimal, 
@@ -88,125 +71,238 @@ class PayrollCalculator:
                            sick_hours: Decimal, vacation_hours: Decimal, 
                            hourly_rate: Decimal) -> Decimal:
         """Calculate gross pay from hours breakdown"""
-        return (
-            regular_hours * hourly_rate +
-            overtime_hours * hourly_rate * Decimal('1.15') +
-            weekend_hours * hourly_rate * Decimal('1.5') +
-            holiday_hours * hourly_rate * Decimal('2.0') +
-            sick_hours * hourly_rate * Decimal('1.0') +
-            vacation_hours * hourly_rate
+        return payroll_core.calculate_gross_pay(regular_hours, overtime_hours, weekend_hours,
+                                                holiday_hours, sick_hours, vacation_hours, hourly_rate)
+    
+    @classmethod
+    def _tally_days(cls, days: Iterable[payroll_core.Day], hourly_rate: Decimal,
+                    start_date: pendulum.DateTime, end_date: pendulum.DateTime,
+                    rules: PayRules = DEFAULT_RULES) -> PayrollCalculation:
+        """Sum (work_date, absence, work_hours) days, in date order, into a PayrollCalculation.
+        
+        ``absence`` is 'sick' or 'vacation' for absence days, None for worked days.
+        """
+        return payroll_core.tally_days(days, hourly_rate, start_date, end_date, rules)
+    
+    @classmethod
+    def calculate_pay_from_entries(cls, entries: list[dict], hourly_rate: Decimal,
+                                   start_date: pendulum.DateTime,
+                                   end_date: pendulum.DateTime,
+                                   current_time: pendulum.DateTime = None,
+                                   rules: PayRules = DEFAULT_RULES) -> PayrollCalculation:
+        """Calculate pay from a period's time entries (sorted by punch time) at one rate"""
+        return payroll_core.calculate_pay(entries, hourly_rate, start_date, end_date, current_time, rules)
+    
+    @classmethod
+    def calculate_pay_from_batch(cls, batch: TimeEntryBatch, hourly_rate: Decimal,
+                                 start_date: pendulum.DateTime,
+                                 end_date: pendulum.DateTime,
+                                 current_time: pendulum.DateTime = None,
+                                 rules: PayRules = DEFAULT_RULES) -> PayrollCalculation:
+        """calculate_pay_from_entries over a TimeEntryBatch, day by day on column slices"""
+        return cls._tally_days(batch.days(current_time), hourly_rate, start_date, end_date, rules)
+    
+    @staticmethod
+    def array_days(punch_micros: np.ndarray, entry_codes: np.ndarray,
+                   current_time: pendulum.DateTime = None) -> list[payroll_core.Day]:
+        """Days of epoch-microsecond / entry-code arrays, for _tally_days.
+        
+        Pairing, day bucketing and absence flags run in NumPy; only the per-day hour
+        totals are turned into Decimal, so results match the entry path exactly.
+        """
+        if current_time is None:
+            current_time = pendulum.now('UTC')
+        now_micros = epoch_micros(current_time)
+        
+        totals = payroll_vectorized.daily_totals(punch_micros, entry_codes, now_micros)
+        sick_days = totals['sick']
+        vacation_days = totals['vacation'] & ~sick_days
+        counted = sick_days | vacation_days | totals['has_punch']
+        
+        days = []
+        for epoch_day, sick, vacation, work_micros in zip(totals['days'][counted].tolist(),
+                                                          sick_days[counted].tolist(),
+                                                          vacation_days[counted].tolist(),
+                                                          totals['work_micros'][counted].tolist()):
+            work_date = EPOCH_DATE.add(days=epoch_day)
+            if sick:
+                days.append((work_date, 'sick', None))
+            elif vacation:
+                days.append((work_date, 'vacation', None))
+            else:
+                days.append((work_date, None, Decimal(work_micros).scaleb(-6) / Decimal('3600')))
+        return days
+    
+    @classmethod
+    def calculate_pay_from_arrays(cls, punch_micros: np.ndarray, entry_codes: np.ndarray,
+                                  hourly_rate: Decimal, start_date: pendulum.DateTime,
+                                  end_date: pendulum.DateTime,
+                                  current_time: pendulum.DateTime = None,
+                                  rules: PayRules = DEFAULT_RULES) -> PayrollCalculation:
+        """Vectorized calculate_pay_from_entries over epoch-microsecond / entry-code arrays (see array_days)"""
+        return cls._tally_days(cls.array_days(punch_micros, entry_codes, current_time), hourly_rate,
+                               start_date, end_date, rules)
+    
+    @classmethod
+    def calculate_pay_from_summaries(cls, summaries: list[dict], hourly_rate: Decimal,
+                                     start_date: pendulum.DateTime,
+                                     end_date: pendulum.DateTime,
+                                     current_time: pendulum.DateTime = None,
+                                     rules: PayRules = DEFAULT_RULES) -> PayrollCalculation:
+        """Calculate pay from daily_work_summary rows (sorted by work_date) at one rate"""
+        return cls._tally_days(cls.summary_days(summaries, current_time), hourly_rate,
+                               start_date, end_date, rules)
+    
+    @staticmethod
+    def summary_days(summaries: Iterable[dict], current_time: pendulum.DateTime = None) -> Iterable[payroll_core.Day]:
+        """Days of daily_work_summary rows, for _tally_days"""
+        if current_time is None:
+            current_time = pendulum.now('UTC')
+        
+        for summary in summaries:
+            if summary['sick']:
+                yield summary['work_date'], 'sick', None
+            elif summary['vacation']:
+                yield summary['work_date'], 'vacation', None
+            elif summary['has_punch']:
+                # Shifts still open run until current_time, as in calculate_daily_hours
+                total_seconds = summary['worked_seconds']
+                for open_since in summary['open_shifts']:
+                    total_seconds += Decimal(str((current_time - open_since).total_seconds()))
+                yield summary['work_date'], None, total_seconds / Decimal('3600')
+    
+    @staticmethod
+    def is_closed_period(end_date: pendulum.DateTime) -> bool:
+        """Check if a period is over, so its payroll can be served from a snapshot"""
+        return end_date < pendulum.now('UTC')
+    
+    @staticmethod
+    def _snapshot_fields(calculation: PayrollCalculation) -> dict:
+        return {field: getattr(calculation, field) for field in SNAPSHOT_FIELDS}
+    
+    @staticmethod
+    def _from_snapshot(snapshot: dict, start_date: pendulum.DateTime,
+                       end_date: pendulum.DateTime) -> PayrollCalculation:
+        return PayrollCalculation(
+            **{field: snapshot[field] for field in SNAPSHOT_FIELDS},
+            period_start=start_date,
+            period_end=end_date,
+            from_snapshot=True
         )
     
     @classmethod
     async def calculate_period_pay(cls, 
                                  start_date: pendulum.DateTime = None, 
-                                 end_date: pendulum.DateTime = None) -> PayrollCalculation:
-        """Calculate pay for a specific period (defaults to current 15-day period)"""
+                                 end_date: pendulum.DateTime = None,
+                                 engine: str = None) -> PayrollCalculation:
+        """Calculate pay for a specific period (defaults to current 15-day period).
+        
+        Closed periods are served from payroll_snapshots once computed.
+        """
         
         if start_date is None or end_date is None:
             start_date, end_date = cls.get_15_day_period_bounds()
         
-        # Get all time entries for the period
-        entries = await get_time_entries_for_period(start_date, end_date)
-        hourly_rate = await get_current_hourly_rate()
+        engine = engine or PAYROLL_ENGINE
+        # The python, numpy and sql engines give identical results and share snapshots
+        snapshot_engine = 'summary' if engine == 'summary' else 'entries'
+        closed = cls.is_closed_period(end_date)
         
-        # Group entries by date
-        daily_entries = cls._group_entries_by_date(entries)
-        
-        # Initialize totals
-        regular_hours = Decimal('0')
-        overtime_hours = Decimal('0')
-        weekend_hours = Decimal('0')
-        holiday_hours = Decimal('0')
-        sick_hours = Decimal('0')
-        vacation_hours = Decimal('0')
-        
-        # Process each day
-        for date_str, day_entries in daily_entries.items():
-            work_date = pendulum.parse(date_str).date()
-            
-            # Handle sick/vacation entries (8-hour blocks)
-            sick_entries = [e for e in day_entries if e['entry_type'] == 'sick']
-            vacation_entries = [e for e in day_entries if e['entry_type'] == 'vacation']
-            
-            if sick_entries:
-                sick_hours += Decimal('8')
-                continue
-            
-            if vacation_entries:
-                vacation_hours += Decimal('8')
-                continue
-            
-            # Calculate actual work hours from punch in/out
-            punch_entries = [e for e in day_entries if e['entry_type'] in ['in', 'out']]
-            if not punch_entries:
-                continue
-                
-            daily_work_hours = cls.calculate_daily_hours(punch_entries)
-            
-            # Apply rate multipliers based on day type
-            if cls.is_holiday(work_date):
-                # Sunday = 2x rate
-                holiday_hours += daily_work_hours
-            elif cls.is_weekend(work_date):
-                # Saturday = 1.5x rate
-                weekend_hours += daily_work_hours
-            else:
-                # Regular weekday - split between regular and overtime
-                if daily_work_hours <= Decimal('8'):
-                    regular_hours += daily_work_hours
-                else:
-                    regular_hours += Decimal('8')
-                    overtime_hours += daily_work_hours - Decimal('8')
-        
-        # Calculate total hours and gross pay
-        total_hours = regular_hours + overtime_hours + weekend_hours + holiday_hours + sick_hours + vacation_hours
-        gross_pay = cls._calculate_gross_pay(regular_hours, overtime_hours, weekend_hours, 
-                                           holiday_hours, sick_hours, vacation_hours, hourly_rate)
+        if closed:
+            snapshots = await get_payroll_snapshots(start_date, end_date, snapshot_engine)
+            if snapshots:
+                return cls._from_snapshot(snapshots[0], start_date, end_date)
+            # Taken before computing, so a write committed meanwhile keeps the result out
+            inputs_version = await get_payroll_inputs_version()
         
-        return PayrollCalculation(
-            regular_hours=regular_hours,
-            overtime_hours=overtime_hours,
-            weekend_hours=weekend_hours,
-            holiday_hours=holiday_hours,
-            sick_hours=sick_hours,
-            vacation_hours=vacation_hours,
-            total_hours=total_hours,
-            gross_pay=gross_pay,
-            hourly_rate=hourly_rate,
-            period_start=start_date,
-            period_end=end_date
-        )
+        calculation = await cls._compute_period_pay(start_date, end_date, engine)
+        
+        if closed:
+            await save_payroll_snapshots(start_date, end_date, snapshot_engine,
+                                         {0: cls._snapshot_fields(calculation)}, inputs_version)
+        return calculation
     
     @classmethod
-    async def get_today_hours(cls, current_time: pendulum.DateTime = None) -> dict:
-        """Get today's work hours and status"""
+    async def _compute_period_pay(cls, start_date: pendulum.DateTime, end_date: pendulum.DateTime,
+                                  engine: str, current_time: pendulum.DateTime = None) -> PayrollCalculation:
+        """Calculate a period's pay with one engine, timing its stages (see metrics.py):
+        fetch the rows, group them into days, compute the pay of the days"""
+        hourly_rate = await get_current_hourly_rate()
+        rules = await cls.get_pay_rules()
         if current_time is None:
             current_time = pendulum.now('UTC')
-            
-        today = current_time.date()
-        start_of_day = pendulum.datetime(today.year, today.month, today.day, tz='UTC')
-        end_of_day = start_of_day.end_of('day')
-        
-        entries = await get_time_entries_for_period(start_of_day, end_of_day)
-        
-        # Check current status (last entry determines if clocked in/out)
-        is_clocked_in = False
-        clock_in_time = None
-        
-        if entries:
-            last_entry = entries[-1]
-            if last_entry['entry_type'] == 'in':
-                is_clocked_in = True
-                clock_in_time = last_entry['punch_time'].format('HH:mm')
-        
-        # Calculate total hours for today
-        punch_entries = [e for e in entries if e['entry_type'] in ['in', 'out']]
-        total_hours = cls.calculate_daily_hours(punch_entries, current_time)
-        
-        return {
-            'total_hours': float(total_hours),
-            'is_clocked_in': is_clocked_in,
-            'clock_in_time': clock_in_time,
-            'entry_count': len(entries)
-        }
\ No newline at end of file
+        
+        with metrics.PAYROLL_STAGE_DURATION.labels(engine, 'fetch').time():
+            if engine == 'summary':
+                rows = await get_daily_summaries_for_period(start_date.date(), end_date.date())
+            elif engine == 'sql':
+                rows = await get_daily_hours_for_period(start_date, end_date)
+            else:
+                batch = await get_time_entry_batch(start_date, end_date)
+        
+        # The summary and sql engines group punches into days in SQL, leaving only the open shifts
+        with metrics.PAYROLL_STAGE_DURATION.labels(engine, 'group').time():
+            if engine == 'numpy':
+                days = cls.array_days(batch.punch_micros, batch.entry_codes, current_time)
+            elif engine in ('summary', 'sql'):
+                days = list(cls.summary_days(rows, current_time))
+            else:
+                days = list(batch.days(current_time))
+        
+        with metrics.PAYROLL_STAGE_DURATION.labels(engine, 'compute').time():
+            return cls._tally_days(days, hourly_rate, start_date, end_date, rules)
+    
+    @classmethod
+    async def calculate_employee_period_pay(cls,
+                                          start_date: pendulum.DateTime = None,
+                                          end_date: pendulum.DateTime = None) -> dict[int, PayrollCalculation]:
+        """Calculate pay per employee at their own hourly rate from the daily rollup.
+        
+        Closed periods are served from payroll_snapshots once computed.
+        """
+        
+        if start_date is None or end_date is None:
+            start_date, end_date = cls.get_15_day_period_bounds()
+        
+        closed = cls.is_closed_period(end_date)
+        
+        if closed:
+            snapshots = await get_payroll_snapshots(start_date, end_date, 'employees')
+            if snapshots:
+                return {
+                    snapshot['employee_id']: cls._from_snapshot(snapshot, start_date, end_date)
+                    for snapshot in snapshots
+                }
+            inputs_version = await get_payroll_inputs_version()
+        
+        calculations: dict[int, PayrollCalculation] = {}
+        async for employee, calculation in cls.iter_employee_period_pay(start_date, end_date):
+            calculations[employee['id']] = calculation
+        
+        if closed and calculations:
+            await save_payroll_snapshots(start_date, end_date, 'employees', {
+                employee_id: cls._snapshot_fields(calculation)
+                for employee_id, calculation in calculations.items()
+            }, inputs_version)
+        return calculations
+    
+    @classmethod
+    async def iter_employee_period_pay(cls, start_date: pendulum.DateTime, end_date: pendulum.DateTime,
+                                       construction_site_id: Optional[int] = None) -> AsyncGenerator[tuple[dict, PayrollCalculation], None]:
+        """Stream (employee, PayrollCalculation) pairs from the daily rollup, one employee at a time"""
+        current_time = pendulum.now('UTC')
+        rules = await cls.get_pay_rules()
+        async for employee, summaries in iter_employee_daily_summaries(start_date.date(), end_date.date(),
+                                                                       construction_site_id):
+            yield employee, cls.calculate_pay_from_summaries(summaries, employee['hourly_rate'],
+                                                             start_date, end_date, current_time, rules)
+    
+    @classmethod
+    async def load_replay(cls, start_date: pendulum.DateTime, end_date: pendulum.DateTime) -> ReplayEngine:
+        """Load a period's entries once for what-if pricing, each employee at their own rate"""
+        rules = await cls.get_pay_rules()
+        rates = {employee['id']: employee['hourly_rate'] for employee in await get_all_employees()}
+        # Punches without an employee are priced at the global rate, as in calculate_period_pay
+        rates[None] = await get_current_hourly_rate()
+        batch = await get_time_entry_batch(start_date, end_date)
+        return ReplayEngine.from_batch(batch, rates, start_date, end_date, calendar=rules.calendar)
@@ -0,0 +1,240 @@
+"""Pure payroll calculation: time entries and a rate in, PayrollCalculation out.
+
+Nothing here touches the database or the event loop, so the same functions serve
+the API engines, the what-if replay and offline scripts.
+"""
+import hashlib
+import pendulum
+from datetime import date
+from decimal import Decimal
+from typing import Optional, Iterable, Iterator, Mapping
+from dataclasses import dataclass, field
+
+# (work_date, absence, work_hours): absence is 'sick' or 'vacation' for absence days
+# (work_hours None), None for worked days
+Day = tuple[pendulum.Date, Optional[str], Optional[Decimal]]
+
+@dataclass
+class PayrollCalculation:
+    regular_hours: Decimal
+    overtime_hours: Decimal
+    weekend_hours: Decimal
+    holiday_hours: Decimal
+    sick_hours: Decimal
+    vacation_hours: Decimal
+    total_hours: Decimal
+    gross_pay: Decimal
+    hourly_rate: Decimal
+    period_start: pendulum.DateTime
+    period_end: pendulum.DateTime
+    from_snapshot: bool = False
+
+# Day types, as stored in a PayCalendar
+WORKDAY, WEEKEND, HOLIDAY = 0, 1, 2
+DAY_TYPES = {'workday': WORKDAY, 'weekend': WEEKEND, 'holiday': HOLIDAY}
+
+class PayCalendar:
+    """Day type of every date, from a weekly pattern plus per-date overrides (public holidays).
+
+    Each year is compiled once, on first use, into a bytes table indexed by day of
+    year, so a lookup is two index operations. Build a new calendar when the rules
+    change; an existing one never goes stale.
+    """
+
+    def __init__(self, weekend_days: Iterable[int] = (5,), rest_days: Iterable[int] = (6,),
+                 overrides: Optional[Mapping[date, int]] = None):
+        # Weekday numbers (Monday=0); rest days are paid at the holiday rate
+        weekend_days, rest_days = set(weekend_days), set(rest_days)
+        self._week = [HOLIDAY if weekday in rest_days else WEEKEND if weekday in weekend_days else WORKDAY
+                      for weekday in range(7)]
+        self._overrides = dict(overrides or {})
+        # year -> (ordinal of 1 January, day types by day of year)
+        self._years: dict[int, tuple[int, bytes]] = {}
+
+    def _compile_year(self, year: int) -> tuple[int, bytes]:
+        first = date(year, 1, 1).toordinal()
+        length = date(year + 1, 1, 1).toordinal() - first
+        first_weekday = date(year, 1, 1).weekday()
+        types = bytearray(self._week[(first_weekday + offset) % 7] for offset in range(length))
+        for day, day_type in self._overrides.items():
+            if day.year == year:
+                types[day.toordinal() - first] = day_type
+        compiled = self._years[year] = (first, bytes(types))
+        return compiled
+
+    def day_type(self, day: date) -> int:
+        first, types = self._years.get(day.year) or self._compile_year(day.year)
+        return types[day.toordinal() - first]
+
+# Saturday at the weekend rate, Sunday at the holiday rate, no public holidays
+DEFAULT_CALENDAR = PayCalendar()
+
+@dataclass(frozen=True)
+class PayRules:
+    """Multipliers and thresholds applied when tallying days; the defaults are the house rules"""
+    overtime_threshold: Decimal = Decimal('8')
+    overtime_multiplier: Decimal = Decimal('1.15')
+    weekend_multiplier: Decimal = Decimal('1.5')
+    holiday_multiplier: Decimal = Decimal('2.0')
+    sick_multiplier: Decimal = Decimal('1.0')
+    vacation_multiplier: Decimal = Decimal('1')
+    # Hours credited for a sick or vacation day
+    absence_hours: Decimal = Decimal('8')
+    calendar: PayCalendar = field(default=DEFAULT_CALENDAR, compare=False)
+    # Identifies the rule set and holidays the rules were compiled from
+    version: str = field(default='default', compare=False)
+
+DEFAULT_RULES = PayRules()
+
+# PayRules fields configured per rule set
+RULE_FIELDS = ('overtime_threshold', 'overtime_multiplier', 'weekend_multiplier', 'holiday_multiplier',
+               'sick_multiplier', 'vacation_multiplier', 'absence_hours')
+
+def compile_pay_rules(rule_set: Optional[Mapping], holidays: Iterable[tuple[date, str]]) -> PayRules:
+    """Build PayRules and their calendar from a pay_rule_sets row and (date, day type) overrides.
+    
+    Without a rule set the house rules apply, still with the given overrides.
+    """
+    holidays = list(holidays)
+    rule_set = rule_set or {}
+    version = hashlib.md5(repr((sorted(rule_set.items()), holidays)).encode()).hexdigest()[:12]
+    calendar = PayCalendar(rule_set.get('weekend_days', (5,)), rule_set.get('rest_days', (6,)),
+                           {day: DAY_TYPES[day_type] for day, day_type in holidays})
+    return PayRules(**{name: rule_set[name] for name in RULE_FIELDS if name in rule_set},
+                    calendar=calendar, version=version)
+
+def is_weekend(date: pendulum.Date, calendar: PayCalendar = DEFAULT_CALENDAR) -> bool:
+    """Check if date is paid above the weekday rate (weekend or holiday)"""
+    return calendar.day_type(date) != WORKDAY
+
+def is_holiday(date: pendulum.Date, calendar: PayCalendar = DEFAULT_CALENDAR) -> bool:
+    """Check if date is paid at the holiday rate"""
+    return calendar.day_type(date) == HOLIDAY
+
+def calculate_daily_hours(entries: list[dict], current_time: pendulum.DateTime = None) -> Decimal:
+    """Calculate work hours for a single day from punch entries"""
+    if current_time is None:
+        current_time = pendulum.now('UTC')
+
+    total_seconds = Decimal('0')
+    in_time = None
+
+    for entry in entries:
+        if entry['entry_type'] == 'in':
+            in_time = entry['punch_time']
+        elif entry['entry_type'] == 'out' and in_time:
+            duration = entry['punch_time'] - in_time
+            total_seconds += Decimal(str(duration.total_seconds()))
+            in_time = None
+
+    # If still clocked in, calculate until current_time
+    if in_time:
+        duration = current_time - in_time
+        total_seconds += Decimal(str(duration.total_seconds()))
+
+    return total_seconds / Decimal('3600')  # Convert to hours
+
+def group_entries_by_date(entries: Iterable[dict]) -> dict[str, list]:
+    """Group time entries by date"""
+    daily_entries: dict[str, list] = {}
+    for entry in entries:
+        date_key = entry['punch_time'].date().isoformat()
+        if date_key not in daily_entries:
+            daily_entries[date_key] = []
+        daily_entries[date_key].append(entry)
+    return daily_entries
+
+def entry_days(entries: Iterable[dict], current_time: pendulum.DateTime = None) -> Iterator[Day]:
+    """Reduce time entries (sorted by punch time) to (work_date, absence, work_hours) days"""
+    for date_str, day_entries in group_entries_by_date(entries).items():
+        work_date = pendulum.parse(date_str).date()
+
+        if any(e['entry_type'] == 'sick' for e in day_entries):
+            yield work_date, 'sick', None
+            continue
+
+        if any(e['entry_type'] == 'vacation' for e in day_entries):
+            yield work_date, 'vacation', None
+            continue
+
+        # Calculate actual work hours from punch in/out
+        punch_entries = [e for e in day_entries if e['entry_type'] in ['in', 'out']]
+        if punch_entries:
+            yield work_date, None, calculate_daily_hours(punch_entries, current_time)
+
+def calculate_gross_pay(regular_hours: Decimal, overtime_hours: Decimal,
+                        weekend_hours: Decimal, holiday_hours: Decimal,
+                        sick_hours: Decimal, vacation_hours: Decimal,
+                        hourly_rate: Decimal, rules: PayRules = DEFAULT_RULES) -> Decimal:
+    """Calculate gross pay from hours breakdown"""
+    return (
+        regular_hours * hourly_rate +
+        overtime_hours * hourly_rate * rules.overtime_multiplier +
+        weekend_hours * hourly_rate * rules.weekend_multiplier +
+        holiday_hours * hourly_rate * rules.holiday_multiplier +
+        sick_hours * hourly_rate * rules.sick_multiplier +
+        vacation_hours * hourly_rate * rules.vacation_multiplier
+    )
+
+def tally_days(days: Iterable[Day], hourly_rate: Decimal, start_date: pendulum.DateTime,
+               end_date: pendulum.DateTime, rules: PayRules = DEFAULT_RULES) -> PayrollCalculation:
+    """Sum (work_date, absence, work_hours) days, in date order, into a PayrollCalculation"""
+    # Initialize totals
+    regular_hours = Decimal('0')
+    overtime_hours = Decimal('0')
+    weekend_hours = Decimal('0')
+    holiday_hours = Decimal('0')
+    sick_hours = Decimal('0')
+    vacation_hours = Decimal('0')
+    threshold = rules.overtime_threshold
+    day_type = rules.calendar.day_type
+
+    for work_date, absence, daily_work_hours in days:
+        # Handle sick/vacation entries (fixed-hour blocks)
+        if absence == 'sick':
+            sick_hours += rules.absence_hours
+            continue
+
+        if absence == 'vacation':
+            vacation_hours += rules.absence_hours
+            continue
+
+        # Apply rate multipliers based on day type
+        kind = day_type(work_date)
+        if kind == HOLIDAY:
+            holiday_hours += daily_work_hours
+        elif kind == WEEKEND:
+            weekend_hours += daily_work_hours
+        else:
+            # Regular weekday - split between regular and overtime
+            if daily_work_hours <= threshold:
+                regular_hours += daily_work_hours
+            else:
+                regular_hours += threshold
+                overtime_hours += daily_work_hours - threshold
+
+    # Calculate total hours and gross pay
+    total_hours = regular_hours + overtime_hours + weekend_hours + holiday_hours + sick_hours + vacation_hours
+    gross_pay = calculate_gross_pay(regular_hours, overtime_hours, weekend_hours,
+                                    holiday_hours, sick_hours, vacation_hours, hourly_rate, rules)
+
+    return PayrollCalculation(
+        regular_hours=regular_hours,
+        overtime_hours=overtime_hours,
+        weekend_hours=weekend_hours,
+        holiday_hours=holiday_hours,
+        sick_hours=sick_hours,
+        vacation_hours=vacation_hours,
+        total_hours=total_hours,
+        gross_pay=gross_pay,
+        hourly_rate=hourly_rate,
+        period_start=start_date,
+        period_end=end_date
+    )
+
+def calculate_pay(entries: Iterable[dict], hourly_rate: Decimal,
+                  start_date: pendulum.DateTime, end_date: pendulum.DateTime,
+                  current_time: pendulum.DateTime = None,
+                  rules: PayRules = DEFAULT_RULES) -> PayrollCalculation:
+    """Calculate pay from a period's time entries (sorted by punch time) at one rate"""
+    return tally_days(entry_days(entries, current_time), hourly_rate, start_date, end_date, rules)
@@ -0,0 +1,162 @@
+"""What-if payroll: load a period's entries once, then price it under alternative PayRules.
+
+Loading pairs the punches and classifies every employee-day once. Changing a
+multiplier or the overtime threshold never changes that work, only how the day
+totals are priced, so a ReplayEngine answers any number of scenarios in a single
+pass over the compact day totals instead of a full recalculation per scenario.
+Like payroll_core, nothing here touches the database.
+"""
+import pendulum
+from decimal import Decimal
+from typing import Iterable, Optional
+from dataclasses import dataclass, field
+
+import payroll_core
+from payroll_core import Day, PayRules, PayCalendar, DEFAULT_RULES, DEFAULT_CALENDAR, HOLIDAY, WEEKEND
+from time_entry_batch import TimeEntryBatch
+
+@dataclass(frozen=True)
+class Scenario:
+    name: str
+    rules: PayRules = DEFAULT_RULES
+
+@dataclass
+class EmployeeDays:
+    """One employee's period reduced to what pricing needs"""
+    hourly_rate: Decimal
+    # Worked weekday hours in date order; the only part the overtime threshold splits
+    weekday_hours: list[Decimal] = field(default_factory=list)
+    weekend_hours: Decimal = Decimal('0')
+    holiday_hours: Decimal = Decimal('0')
+    sick_days: int = 0
+    vacation_days: int = 0
+
+@dataclass
+class ScenarioResult:
+    name: str
+    rules: PayRules
+    regular_hours: Decimal
+    overtime_hours: Decimal
+    weekend_hours: Decimal
+    holiday_hours: Decimal
+    sick_hours: Decimal
+    vacation_hours: Decimal
+    total_hours: Decimal
+    gross_pay: Decimal
+    employee_pay: dict[Optional[int], Decimal]
+
+class ReplayEngine:
+    def __init__(self, employees: dict[Optional[int], EmployeeDays],
+                 start_date: pendulum.DateTime, end_date: pendulum.DateTime):
+        self.employees = employees
+        self.start_date = start_date
+        self.end_date = end_date
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[dict], rates: dict[Optional[int], Decimal],
+                     start_date: pendulum.DateTime, end_date: pendulum.DateTime,
+                     current_time: pendulum.DateTime = None,
+                     calendar: PayCalendar = DEFAULT_CALENDAR) -> 'ReplayEngine':
+        """Build from time entries (sorted by punch time) carrying employee_id.
+
+        Punches are paired per employee, each priced at ``rates[employee_id]``;
+        entries without an employee use ``rates[None]``. Days are typed once with
+        ``calendar``; the calendars of the evaluated scenarios are not consulted.
+        """
+        if current_time is None:
+            current_time = pendulum.now('UTC')
+
+        by_employee: dict[Optional[int], list[dict]] = {}
+        for entry in entries:
+            by_employee.setdefault(entry['employee_id'], []).append(entry)
+
+        employees = {
+            employee_id: cls._employee_days(rates[employee_id],
+                                            payroll_core.entry_days(employee_entries, current_time), calendar)
+            for employee_id, employee_entries in by_employee.items()
+        }
+        return cls(employees, start_date, end_date)
+
+    @classmethod
+    def from_batch(cls, batch: TimeEntryBatch, rates: dict[Optional[int], Decimal],
+                   start_date: pendulum.DateTime, end_date: pendulum.DateTime,
+                   current_time: pendulum.DateTime = None,
+                   calendar: PayCalendar = DEFAULT_CALENDAR) -> 'ReplayEngine':
+        """from_entries over a TimeEntryBatch, each employee's punches a slice of it"""
+        if current_time is None:
+            current_time = pendulum.now('UTC')
+
+        employees = {
+            employee_id: cls._employee_days(rates[employee_id], employee_batch.days(current_time), calendar)
+            for employee_id, employee_batch in batch.iter_employees()
+        }
+        return cls(employees, start_date, end_date)
+
+    @staticmethod
+    def _employee_days(hourly_rate: Decimal, days: Iterable[Day], calendar: PayCalendar) -> EmployeeDays:
+        employee_days = EmployeeDays(hourly_rate=hourly_rate)
+        for work_date, absence, hours in days:
+            if absence == 'sick':
+                employee_days.sick_days += 1
+            elif absence == 'vacation':
+                employee_days.vacation_days += 1
+            elif calendar.day_type(work_date) == HOLIDAY:
+                employee_days.holiday_hours += hours
+            elif calendar.day_type(work_date) == WEEKEND:
+                employee_days.weekend_hours += hours
+            else:
+                employee_days.weekday_hours.append(hours)
+        return employee_days
+
+    def evaluate(self, scenarios: list[Scenario]) -> list[ScenarioResult]:
+        """Price the loaded period under every scenario in one pass over the day totals.
+
+        With the default rules the per-employee figures equal payroll_core.calculate_pay
+        on that employee's entries.
+        """
+        thresholds = sorted({scenario.rules.overtime_threshold for scenario in scenarios})
+        totals = [
+            dict.fromkeys(('regular_hours', 'overtime_hours', 'weekend_hours', 'holiday_hours',
+                           'sick_hours', 'vacation_hours', 'total_hours', 'gross_pay'), Decimal('0'))
+            for _ in scenarios
+        ]
+        employee_pay: list[dict] = [{} for _ in scenarios]
+
+        for employee_id, days in self.employees.items():
+            # The regular/overtime split only depends on the threshold, so it is
+            # computed once per distinct threshold rather than once per scenario
+            split = {threshold: [Decimal('0'), Decimal('0')] for threshold in thresholds}
+            for hours in days.weekday_hours:
+                for threshold, regular_overtime in split.items():
+                    if hours <= threshold:
+                        regular_overtime[0] += hours
+                    else:
+                        regular_overtime[0] += threshold
+                        regular_overtime[1] += hours - threshold
+
+            for index, scenario in enumerate(scenarios):
+                rules = scenario.rules
+                regular_hours, overtime_hours = split[rules.overtime_threshold]
+                sick_hours = rules.absence_hours * days.sick_days
+                vacation_hours = rules.absence_hours * days.vacation_days
+                gross_pay = payroll_core.calculate_gross_pay(
+                    regular_hours, overtime_hours, days.weekend_hours, days.holiday_hours,
+                    sick_hours, vacation_hours, days.hourly_rate, rules)
+
+                total = totals[index]
+                total['regular_hours'] += regular_hours
+                total['overtime_hours'] += overtime_hours
+                total['weekend_hours'] += days.weekend_hours
+                total['holiday_hours'] += days.holiday_hours
+                total['sick_hours'] += sick_hours
+                total['vacation_hours'] += vacation_hours
+                total['total_hours'] += (regular_hours + overtime_hours + days.weekend_hours
+                                         + days.holiday_hours + sick_hours + vacation_hours)
+                total['gross_pay'] += gross_pay
+                employee_pay[index][employee_id] = gross_pay
+
+        return [
+            ScenarioResult(name=scenario.name, rules=scenario.rules,
+                           employee_pay=employee_pay[index], **totals[index])
+            for index, scenario in enumerate(scenarios)
+        ]
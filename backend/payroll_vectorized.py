@@ -0,0 +1,57 @@
+import numpy as np
+
+# Entry type codes used in the columnar time entry arrays
+ENTRY_IN = 0
+ENTRY_OUT = 1
+ENTRY_SICK = 2
+ENTRY_VACATION = 3
+
+ENTRY_TYPE_CODES = {'in': ENTRY_IN, 'out': ENTRY_OUT, 'sick': ENTRY_SICK, 'vacation': ENTRY_VACATION}
+
+MICROS_PER_DAY = 86_400 * 1_000_000
+
+def daily_totals(punch_micros: np.ndarray, entry_codes: np.ndarray, now_micros: int) -> dict[str, np.ndarray]:
+    """Pair punches and bucket them by UTC day in bulk.
+
+    Input must be sorted by punch time. Mirrors PayrollCalculator.calculate_daily_hours:
+    an 'out' closes the latest 'in' of the same day, a stray 'out' is ignored, and a
+    shift still open at the end of a day runs until ``now_micros``.
+    Returns per-day arrays: epoch ``days``, ``work_micros`` and the ``has_punch``,
+    ``sick`` and ``vacation`` flags.
+    """
+    day_of_entry = punch_micros // MICROS_PER_DAY
+    days, day_index = np.unique(day_of_entry, return_inverse=True)
+    day_count = len(days)
+
+    sick = np.zeros(day_count, dtype=bool)
+    sick[day_index[entry_codes == ENTRY_SICK]] = True
+    vacation = np.zeros(day_count, dtype=bool)
+    vacation[day_index[entry_codes == ENTRY_VACATION]] = True
+
+    is_punch = entry_codes <= ENTRY_OUT
+    times = punch_micros[is_punch]
+    codes = entry_codes[is_punch]
+    punch_days = day_index[is_punch]
+
+    has_punch = np.zeros(day_count, dtype=bool)
+    has_punch[punch_days] = True
+
+    # An 'out' counts when the previous punch of the same day is an 'in'
+    paired = (codes[1:] == ENTRY_OUT) & (codes[:-1] == ENTRY_IN) & (punch_days[1:] == punch_days[:-1])
+    durations = (times[1:] - times[:-1])[paired]
+    work_micros = np.zeros(day_count, dtype=np.int64)
+    np.add.at(work_micros, punch_days[1:][paired], durations)
+
+    # A day whose last punch is an 'in' is still open
+    last_of_day = np.ones(len(codes), dtype=bool)
+    last_of_day[:-1] = punch_days[1:] != punch_days[:-1]
+    still_open = last_of_day & (codes == ENTRY_IN)
+    np.add.at(work_micros, punch_days[still_open], now_micros - times[still_open])
+
+    return {
+        'days': days,
+        'work_micros': work_micros,
+        'has_punch': has_punch,
+        'sick': sick,
+        'vacation': vacation,
+    }
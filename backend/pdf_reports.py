@@ -0,0 +1,185 @@
+import asyncio
+import calendar
+import io
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+logger = logging.getLogger(__name__)
+
+PDF_WORKERS = int(os.getenv('PDF_WORKERS', '2'))
+PDF_CACHE_DIR = Path(os.getenv('PDF_CACHE_DIR', '/tmp/payroll-pdf-cache'))
+
+MONTH_NAMES = ['Janvier', 'Février', 'Mars', 'Avril', 'Mai', 'Juin',
+               'Juillet', 'Août', 'Septembre', 'Octobre', 'Novembre', 'Décembre']
+
+# Short codes printed for non-worked timesheet statuses
+STATUS_CODES = {'holiday': 'V', 'sick': 'M', 'justified': 'J'}
+
+TABLE_STYLE = [
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+    ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('ALIGN', (1, 0), (-1, -1), 'CENTER'),
+]
+
+# Render functions take plain, picklable data and return PDF bytes, so they run
+# in worker processes without database or event loop access
+
+def _build_pdf(title: str, subtitle: str, table: Table) -> bytes:
+    buffer = io.BytesIO()
+    document = SimpleDocTemplate(buffer, pagesize=landscape(A4), title=title,
+                                 leftMargin=10 * mm, rightMargin=10 * mm,
+                                 topMargin=10 * mm, bottomMargin=10 * mm)
+    styles = getSampleStyleSheet()
+    document.build([
+        Paragraph(title, styles['Title']),
+        Paragraph(subtitle, styles['Normal']),
+        Spacer(1, 4 * mm),
+        table,
+    ])
+    return buffer.getvalue()
+
+def _cell_hours(in_time: str, out_time: str) -> float:
+    """Hours between two HH:MM cell values (0 when either is missing)"""
+    if not in_time or not out_time:
+        return 0.0
+    in_hours, in_minutes = map(int, in_time.split(':'))
+    out_hours, out_minutes = map(int, out_time.split(':'))
+    return max(0, (out_hours * 60 + out_minutes) - (in_hours * 60 + in_minutes)) / 60
+
+def render_timesheet_pdf(site_name: str, year: int, month: int,
+                         employees: list[dict], cells: dict) -> bytes:
+    """Render the month x employee timesheet grid built by the /api/timesheet endpoint"""
+    day_count = calendar.monthrange(year, month)[1]
+    weekend_days = [day for day in range(1, day_count + 1) if calendar.weekday(year, month, day) >= 5]
+
+    rows = [['Employé', *[str(day) for day in range(1, day_count + 1)], 'Total']]
+    for employee in employees:
+        row = [f"{employee['name']} {employee['last_name']}"]
+        total_hours = 0.0
+        for day in range(1, day_count + 1):
+            prefix = f"{employee['id']}-{day}-"
+            status = cells.get(prefix + 'status')
+            if status in STATUS_CODES:
+                row.append(STATUS_CODES[status])
+                continue
+            hours = _cell_hours(cells.get(prefix + 'in'), cells.get(prefix + 'out'))
+            total_hours += hours
+            row.append(f"{hours:.1f}" if hours else '')
+        row.append(f"{total_hours:.1f}")
+        rows.append(row)
+
+    table = Table(rows, colWidths=[42 * mm] + [7.2 * mm] * day_count + [12 * mm], repeatRows=1)
+    table.setStyle(TableStyle(TABLE_STYLE + [('FONTSIZE', (0, 0), (-1, -1), 6)] + [
+        ('BACKGROUND', (day, 1), (day, -1), colors.whitesmoke) for day in weekend_days
+    ]))
+    return _build_pdf(f"Feuille de Temps - {site_name}",
+                      f"{MONTH_NAMES[month - 1]} {year} · V = Vacances, M = Malade, J = Absence Justifiée",
+                      table)
+
+def render_payroll_pdf(site_name: str, year: int, month: int, payroll: list[dict]) -> bytes:
+    """Render per-employee payroll rows (PayrollCalculation fields plus name) for a month"""
+    rows = [['Employé', 'Normales', 'Sup.', 'Samedi', 'Dimanche', 'Malade', 'Vacances',
+             'Total h', 'Taux', 'Brut']]
+    total_pay = Decimal('0')
+    for line in payroll:
+        rows.append([
+            f"{line['name']} {line['last_name']}",
+            *[f"{line[field]:.2f}" for field in ('regular_hours', 'overtime_hours', 'weekend_hours',
+                                                 'holiday_hours', 'sick_hours', 'vacation_hours',
+                                                 'total_hours', 'hourly_rate', 'gross_pay')]
+        ])
+        total_pay += line['gross_pay']
+    rows.append(['Total', *[''] * 8, f"{total_pay:.2f}"])
+
+    table = Table(rows, colWidths=[60 * mm] + [22 * mm] * 9, repeatRows=1)
+    table.setStyle(TableStyle(TABLE_STYLE + [
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+    ]))
+    return _build_pdf(f"Paie - {site_name}", f"{MONTH_NAMES[month - 1]} {year}", table)
+
+class PdfReportCache:
+    """Render reports in a process pool and keep the results on local disk.
+    
+    Files are keyed by report kind, site, month and data version; a new version
+    replaces the older files of the same report. Concurrent requests for the same
+    file share one render.
+    """
+    
+    def __init__(self, directory: Path = PDF_CACHE_DIR, workers: int = PDF_WORKERS):
+        self.directory = directory
+        self.workers = workers
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.rendering: dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.renders = 0
+    
+    def start(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+    
+    def stop(self) -> None:
+        if self.executor:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+    
+    @staticmethod
+    def report_prefix(kind: str, construction_site_id: Optional[int], year: int, month: int) -> str:
+        return f"{kind}-site{construction_site_id or 'all'}-{year}-{month:02d}-"
+    
+    async def get(self, prefix: str, version: str,
+                  render: Callable[..., bytes], load: Callable[[], Awaitable[tuple]]) -> Path:
+        """Return the cached file for ``prefix`` + ``version``, rendering it on a miss.
+        
+        ``load`` fetches the render arguments and only runs on a miss.
+        """
+        path = self.directory / f"{prefix}{version}.pdf"
+        if path.exists():
+            self.hits += 1
+            return path
+        
+        pending = self.rendering.get(path.name)
+        if pending is None:
+            pending = asyncio.ensure_future(self._render(path, prefix, render, load))
+            self.rendering[path.name] = pending
+            pending.add_done_callback(lambda _: self.rendering.pop(path.name, None))
+        return await asyncio.shield(pending)
+    
+    async def _render(self, path: Path, prefix: str,
+                      render: Callable[..., bytes], load: Callable[[], Awaitable[tuple]]) -> Path:
+        args = await load()
+        content = await asyncio.get_running_loop().run_in_executor(self.executor, render, *args)
+        self.renders += 1
+        
+        # Write-then-rename so readers never see a partial file
+        temp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        temp_path.write_bytes(content)
+        os.replace(temp_path, path)
+        
+        for stale in self.directory.glob(f"{prefix}*.pdf"):
+            if stale != path:
+                stale.unlink(missing_ok=True)
+        logger.info(f"Rendered {path.name} ({len(content)} bytes)")
+        return path
+    
+    def stats(self) -> dict[str, Any]:
+        return {
+            'hits': self.hits,
+            'renders': self.renders,
+            'rendering': len(self.rendering),
+            'files': sum(1 for _ in self.directory.glob('*.pdf')) if self.directory.exists() else 0,
+        }
+
+report_cache = PdfReportCache()
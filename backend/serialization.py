@@ -0,0 +1,116 @@
+"""Response serialization: orjson for JSON, MessagePack and Arrow IPC on request.
+
+JSON is always available. MessagePack and Arrow need the optional ``msgpack`` and
+``pyarrow`` packages (the ``binary`` extra); without them those formats are
+simply not offered and negotiation falls back to JSON.
+"""
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Iterable, Optional
+
+import orjson
+from fastapi import Request, Response
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+JSON_MEDIA_TYPE = 'application/json'
+MSGPACK_MEDIA_TYPE = 'application/msgpack'
+ARROW_MEDIA_TYPE = 'application/vnd.apache.arrow.stream'
+
+# Other names clients send for the same formats
+MEDIA_TYPE_ALIASES = {
+    'application/x-msgpack': MSGPACK_MEDIA_TYPE,
+    'application/vnd.msgpack': MSGPACK_MEDIA_TYPE,
+}
+
+def to_builtin(value: Any) -> Any:
+    """Fallback for types the encoders lack: Decimals become floats (as in the response
+    models), datetimes (pendulum included) ISO 8601 strings, records dicts"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if hasattr(value, 'items'):
+        return dict(value.items())
+    raise TypeError(f"Type is not serializable: {type(value).__name__}")
+
+def encode_json(content: Any) -> bytes:
+    return orjson.dumps(content, default=to_builtin, option=orjson.OPT_SERIALIZE_NUMPY)
+
+def encode_msgpack(content: Any) -> bytes:
+    return msgpack.packb(content, default=to_builtin)
+
+def encode_arrow(table: 'pa.Table') -> bytes:
+    """Arrow IPC stream of a table"""
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+# Encoders of JSON-shaped content by media type; Arrow encodes tables only (see negotiated_response)
+ENCODERS: dict[str, Callable[[Any], bytes]] = {JSON_MEDIA_TYPE: encode_json}
+if msgpack is not None:
+    ENCODERS[MSGPACK_MEDIA_TYPE] = encode_msgpack
+
+class ORJSONResponse(Response):
+    """Default response class: JSON rendered by orjson"""
+    media_type = JSON_MEDIA_TYPE
+
+    def render(self, content: Any) -> bytes:
+        return encode_json(content)
+
+def negotiate(accept: Optional[str], offered: list[str]) -> str:
+    """Pick the offered media type the Accept header prefers (highest q, then header
+    order); the first offered type when none is acceptable or there is no header"""
+    best, best_quality = offered[0], 0.0
+    for entry in (accept or '').split(','):
+        media_range, *params = [part.strip() for part in entry.split(';')]
+        media_range = MEDIA_TYPE_ALIASES.get(media_range.lower(), media_range.lower())
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality <= best_quality:
+            continue
+        if media_range == '*/*':
+            best, best_quality = offered[0], quality
+        elif media_range.endswith('/*'):
+            # A type wildcard takes the first offered type of that major type
+            major_type = media_range[:-1]
+            matched = next((media_type for media_type in offered if media_type.startswith(major_type)), None)
+            if matched is not None:
+                best, best_quality = matched, quality
+        elif media_range in offered:
+            best, best_quality = media_range, quality
+    return best
+
+def records_table(records: Iterable[Any], columns: Optional[list[str]] = None) -> 'pa.Table':
+    """Arrow table from dict-like rows, built column by column"""
+    records = list(records)
+    if columns is None:
+        columns = list(records[0].keys()) if records else []
+    return pa.table({column: [record[column] for record in records] for column in columns})
+
+def negotiated_response(request: Request, content: Callable[[], Any],
+                        table: Optional[Callable[[], 'pa.Table']] = None) -> Response:
+    """Serialize ``content()`` as JSON or MessagePack, or ``table()`` as Arrow IPC,
+    whichever the request Accepts; only the chosen one is built"""
+    offered = list(ENCODERS)
+    if table is not None and pa is not None:
+        offered.append(ARROW_MEDIA_TYPE)
+    media_type = negotiate(request.headers.get('accept'), offered)
+
+    body = encode_arrow(table()) if media_type == ARROW_MEDIA_TYPE else ENCODERS[media_type](content())
+    return Response(body, media_type=media_type, headers={'Vary': 'Accept'})
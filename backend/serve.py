@@ -0,0 +1,79 @@
+"""Production entry point: several uvicorn workers sharing one Postgres connection budget.
+
+    python serve.py
+
+WEB_CONCURRENCY sets the worker count, by default one per CPU the container may
+use. Each worker sizes its pool to its share of DB_CONNECTION_BUDGET (see
+database.pool_bounds). Schema migrations and partitions are prepared here once,
+before the workers start, so each worker's own startup check finds them current.
+Workers keep their caches coherent through LISTEN/NOTIFY (see change_feed) and
+share their Prometheus metrics through PROMETHEUS_MULTIPROC_DIR (see metrics).
+"""
+import asyncio
+import glob
+import logging
+import math
+import os
+import tempfile
+
+import uvicorn
+
+import database as db
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+
+def available_cpus() -> int:
+    """CPUs this process may run on, capped by a cgroup v2 CPU quota (docker --cpus)"""
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as cpu_max:
+            quota, period = cpu_max.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+async def prepare_database() -> None:
+    """Apply migrations and create the partitions the workers would otherwise race for"""
+    await db.db_manager.create_pool()
+    try:
+        applied = await db.init_database()
+        logger.info(f"Schema at version {db.SCHEMA_VERSION}, {applied} migrations applied")
+        await db.ensure_time_entry_partitions()
+    finally:
+        await db.db_manager.close_pool()
+
+def prepare_metrics_dir() -> str:
+    """An empty PROMETHEUS_MULTIPROC_DIR: a new temporary one unless it is set.
+
+    Samples left by an earlier run would be added to this run's.
+    """
+    path = os.getenv("PROMETHEUS_MULTIPROC_DIR") or tempfile.mkdtemp(prefix="payroll-metrics-")
+    os.makedirs(path, exist_ok=True)
+    for stale in glob.glob(os.path.join(path, "*.db")):
+        os.remove(stale)
+    return path
+
+def main() -> None:
+    workers = int(os.getenv("WEB_CONCURRENCY") or available_cpus())
+    # Workers inherit the environment: create_pool reads its share from it
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+    min_size, max_size = db.pool_bounds(workers)
+    logger.info(f"Starting {workers} workers, pools of {min_size}-{max_size} connections "
+                f"(budget {db.DB_CONNECTION_BUDGET})")
+    if workers * (max_size + db.LISTEN_CONNECTIONS) > db.DB_CONNECTION_BUDGET:
+        logger.warning(f"{workers} workers can open {workers * (max_size + db.LISTEN_CONNECTIONS)} "
+                       f"connections, over the budget of {db.DB_CONNECTION_BUDGET}")
+
+    asyncio.run(prepare_database())
+    # After the migrations, so only the workers' samples are collected
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = prepare_metrics_dir()
+    uvicorn.run("main:app", host=HOST, port=PORT, workers=workers, log_level="info")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Shared fixtures. Tests using the app run it against PostgreSQL: TEST_DATABASE_URL names
+a scratch database, dropped and recreated once per run. Without it those tests are skipped.
+"""
+import asyncio
+import os
+import uuid
+from typing import Any, Callable
+from urllib.parse import urlsplit
+
+import asyncpg
+import pytest
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+if TEST_DATABASE_URL:
+    # Read by database.py on import
+    os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+
+async def _recreate_database() -> None:
+    name = urlsplit(TEST_DATABASE_URL).path.lstrip('/')
+    conn = await asyncpg.connect(TEST_DATABASE_URL, database='postgres')
+    try:
+        await conn.execute(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)')
+        await conn.execute(f'CREATE DATABASE "{name}"')
+    finally:
+        await conn.close()
+
+@pytest.fixture(scope="session")
+def client():
+    """The app on a fresh database; tests share it, so each one makes its own employees"""
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    asyncio.run(_recreate_database())
+    from fastapi.testclient import TestClient
+    import main
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+@pytest.fixture
+def run_db(client) -> Callable[..., Any]:
+    """Run a database coroutine function on the app's event loop and pool"""
+    def run(func: Callable[..., Any], *args: Any) -> Any:
+        return client.portal.call(func, *args)
+    return run
+
+@pytest.fixture
+def make_employees(client) -> Callable[..., list[int]]:
+    """Create employees on a new construction site; returns their ids"""
+    def make(count: int, hourly_rate: float = 20.0) -> list[int]:
+        role_id = client.get('/api/roles').json()[0]['id']
+        site = client.post('/api/construction-sites', json={
+            'name': f'Site {uuid.uuid4().hex[:8]}', 'address': 'Test'}).json()['construction_site_id']
+        return [
+            client.post('/api/employees', json={
+                'name': f'Employee {number}', 'last_name': uuid.uuid4().hex[:8], 'role_id': role_id,
+                'hourly_rate': hourly_rate, 'construction_site_id': site}).json()['employee_id']
+            for number in range(count)
+        ]
+    return make
+
+async def _stored_punches(employee_id: int) -> list[tuple[str, Any]]:
+    import database as db
+    async with db.db_manager.get_connection() as conn:
+        records = await conn.fetch("""
+            SELECT entry_type, punch_time FROM time_entries WHERE employee_id = $1 ORDER BY punch_time, id
+        """, employee_id)
+    return [(record['entry_type'], record['punch_time']) for record in records]
+
+@pytest.fixture
+def stored_punches(run_db) -> Callable[[int], list[tuple[str, Any]]]:
+    """(entry_type, punch_time) of an employee's punches as stored, by time"""
+    return lambda employee_id: run_db(_stored_punches, employee_id)
@@ -0,0 +1,80 @@
+import asyncio
+
+import pendulum
+
+import database as db
+
+def today_at(fraction: float) -> pendulum.DateTime:
+    """A time between today's UTC midnight and now"""
+    now = pendulum.now('UTC')
+    start = now.start_of('day')
+    return start.add(microseconds=int((now - start).total_seconds() * 1_000_000 * fraction))
+
+def punch(employee_id: int, key: str, entry_type: str, time: pendulum.DateTime) -> dict:
+    return {'employee_id': employee_id, 'client_key': key, 'entry_type': entry_type,
+            'timestamp': time.to_iso8601_string()}
+
+def change_cursor(client) -> int:
+    return client.get('/api/changes').json()['cursor']
+
+def logged_punches(client, since: int, employee_id: int) -> list[tuple[str, pendulum.DateTime]]:
+    changes = client.get('/api/changes', params={'since': since}).json()['changes']
+    return [(change['data']['entry_type'], pendulum.parse(change['data']['punch_time']))
+            for change in changes
+            if change['entity'] == 'time_entry' and change['data']['employee_id'] == employee_id]
+
+def test_repeated_keys_store_and_report_one_punch(client, make_employees, stored_punches):
+    [employee_id] = make_employees(1)
+    clock_in, clock_out = today_at(0.25), today_at(0.5)
+    # Loads the clock tracker, so the batch is applied to it rather than reloaded
+    client.get('/api/hours/today', params={'employee_id': employee_id})
+    cursor = change_cursor(client)
+
+    response = client.post('/api/punch/bulk', json={'punches': [
+        punch(employee_id, f'{employee_id}-a', 'in', clock_in),
+        punch(employee_id, f'{employee_id}-a', 'out', clock_out),
+    ]})
+
+    assert [result['status'] for result in response.json()['results']] == ['created', 'duplicate']
+    assert stored_punches(employee_id) == [('in', clock_in)]
+    assert logged_punches(client, cursor, employee_id) == [('in', clock_in)]
+    hours = client.get('/api/hours/today', params={'employee_id': employee_id}).json()
+    assert hours['is_clocked_in'] and hours['entry_count'] == 1
+
+def test_unknown_employee_rows_do_not_shadow_a_shared_key(client, make_employees, stored_punches):
+    [employee_id] = make_employees(1)
+    stored_time = today_at(0.5)
+    cursor = change_cursor(client)
+
+    response = client.post('/api/punch/bulk', json={'punches': [
+        punch(999_999, f'{employee_id}-b', 'out', today_at(0.25)),
+        punch(employee_id, f'{employee_id}-b', 'in', stored_time),
+    ]})
+
+    assert [result['status'] for result in response.json()['results']] == ['unknown_employee', 'created']
+    assert stored_punches(employee_id) == [('in', stored_time)]
+    assert logged_punches(client, cursor, employee_id) == [('in', stored_time)]
+
+def test_replayed_batch_is_all_duplicates(client, make_employees, stored_punches):
+    [employee_id] = make_employees(1)
+    batch = {'punches': [punch(employee_id, f'{employee_id}-c', 'in', today_at(0.5))]}
+
+    assert client.post('/api/punch/bulk', json=batch).json()['created'] == 1
+    assert client.post('/api/punch/bulk', json=batch).json()['duplicates'] == 1
+    assert len(stored_punches(employee_id)) == 1
+
+def test_concurrent_batches_store_each_key_once(client, make_employees, run_db, stored_punches):
+    [employee_id] = make_employees(1)
+    keys = [f'{employee_id}-d{number}' for number in range(50)]
+    first = [(employee_id, today_at(0.25), 'in', key) for key in keys]
+    # Same keys at other times: the (client_key, punch_time) index alone lets both in
+    second = [(employee_id, today_at(0.5), 'out', key) for key in reversed(keys)]
+
+    async def ingest_both() -> list:
+        return await asyncio.gather(db.insert_time_entries_bulk(first), db.insert_time_entries_bulk(second))
+
+    results = run_db(ingest_both)
+
+    created = [status for batch in results for status, _ in batch if status == 'created']
+    assert len(created) == len(keys)
+    assert len(stored_punches(employee_id)) == len(keys)
@@ -0,0 +1,64 @@
+import asyncio
+
+import pendulum
+
+import database as db
+
+def change_cursor(client) -> int:
+    return client.get('/api/changes').json()['cursor']
+
+async def _log_marker(conn, order: int) -> None:
+    await db._log_changes(conn, 'role', [(None, 'update', {'order': order})])
+
+async def _commit_out_of_order() -> tuple[list, list]:
+    """Two writers: the first logs a change and stays open while the second logs and
+    commits. Returns the marker orders readable while the first is open, then after."""
+    def orders(changes: list) -> list:
+        return [change['data']['order'] for change in changes if change['entity'] == 'role']
+
+    start = await db.get_latest_change()
+    async with db.db_manager.get_connection() as first, db.db_manager.get_connection() as second:
+        transaction = first.transaction()
+        await transaction.start()
+        await _log_marker(first, 1)
+
+        async def log_and_commit() -> None:
+            async with second.transaction():
+                await _log_marker(second, 2)
+
+        # A writer never waits on another one
+        await asyncio.wait_for(log_and_commit(), 5)
+        while_open = orders(await db.get_changes(start, 100))
+        await transaction.commit()
+    return while_open, orders(await db.get_changes(start, 100))
+
+def test_changes_behind_an_open_writer_wait_for_it(client, run_db):
+    while_open, after = run_db(_commit_out_of_order)
+
+    # The second change, with the higher id, is not handed out past the open first one
+    assert while_open == []
+    assert after == [1, 2]
+
+def test_cursor_resumes_after_the_last_change(client, make_employees):
+    cursor = change_cursor(client)
+    make_employees(1)
+
+    page = client.get('/api/changes', params={'since': cursor, 'limit': 1}).json()
+    rest = client.get('/api/changes', params={'since': page['cursor']}).json()
+
+    ids = [change['id'] for change in page['changes'] + rest['changes']]
+    # The site, then the employee
+    assert len(ids) == 2 and len(set(ids)) == 2
+    assert rest['cursor'] == change_cursor(client) == ids[-1]
+    assert client.get('/api/changes', params={'since': rest['cursor']}).json()['changes'] == []
+
+def test_pruned_cursor_is_gone(client, make_employees, run_db):
+    cursor = change_cursor(client)
+    make_employees(1)
+    latest = change_cursor(client)
+
+    run_db(db.prune_change_log, pendulum.now('UTC').add(days=1))
+
+    assert client.get('/api/changes', params={'since': cursor}).status_code == 410
+    assert client.get('/api/changes', params={'since': 0}).status_code == 410
+    assert client.get('/api/changes', params={'since': latest}).json()['changes'] == []
@@ -0,0 +1,39 @@
+import database as db
+
+def revalidate(client, path: str, etag: str) -> int:
+    return client.get(path, headers={'If-None-Match': etag}).status_code
+
+def test_unchanged_reads_get_304_until_a_write(client, make_employees):
+    make_employees(1)
+    etag = client.get('/api/employees').headers['etag']
+
+    assert revalidate(client, '/api/employees', etag) == 304
+    assert revalidate(client, '/api/employees', f'W/{etag}') == 304
+
+    make_employees(1)
+    assert revalidate(client, '/api/employees', etag) == 200
+
+def test_tag_varies_with_the_negotiated_format(client):
+    etag = client.get('/api/roles').headers['etag']
+    assert client.get('/api/roles', headers={'Accept': 'application/msgpack'}).headers['etag'] != etag
+
+async def _write_with_an_old_timestamp(employee_id: int) -> None:
+    """An update committing after a later one, as a slow transaction would: its
+    timestamp is older than the latest, so row count and max(updated_at) stay put"""
+    async with db.db_manager.get_connection() as conn:
+        await conn.execute("""
+            UPDATE employees SET last_name = 'Renamed', updated_at = created_at WHERE id = $1
+        """, employee_id)
+    # As when another worker's write is announced
+    db.tables_changed('employees')
+
+def test_late_commit_with_an_older_timestamp_moves_the_tag(client, make_employees, run_db):
+    # The second one holds the latest updated_at
+    employee_id, _ = make_employees(2)
+    etag = client.get('/api/employees').headers['etag']
+
+    run_db(_write_with_an_old_timestamp, employee_id)
+
+    response = client.get('/api/employees', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert any(employee['last_name'] == 'Renamed' for employee in response.json())
@@ -0,0 +1,61 @@
+import random
+import uuid
+from dataclasses import asdict
+
+import pendulum
+
+from payroll import PayrollCalculator
+
+START = pendulum.datetime(2024, 6, 1, tz='UTC')
+END = pendulum.datetime(2024, 6, 10, tz='UTC').end_of('day')
+# Shifts are laid out in this zone's evenings, so they cross the UTC midnight
+LOCAL_TIMEZONE = 'America/New_York'
+
+def shifts(employee_ids: list[int]) -> list[dict]:
+    """Interleaved evening shifts in New York time, so most cross the UTC midnight, with
+    repeated punches, absences and a shift still open at the end"""
+    rng = random.Random(17)
+    prefix = uuid.uuid4().hex[:8]
+    punches = []
+
+    def add(employee_id: int, entry_type: str, time: pendulum.DateTime) -> None:
+        punches.append({'employee_id': employee_id, 'entry_type': entry_type,
+                        'timestamp': time.to_iso8601_string(),
+                        'client_key': f'{prefix}-{len(punches)}'})
+
+    for day in range(1, 10):
+        for number, employee_id in enumerate(employee_ids):
+            local_day = pendulum.datetime(2024, 6, day, tz=LOCAL_TIMEZONE)
+            if (day, number) == (4, 0):
+                add(employee_id, 'sick', local_day.add(hours=9))
+                continue
+            if (day, number) == (6, 1):
+                add(employee_id, 'vacation', local_day.add(hours=9))
+                continue
+            clock_in = local_day.add(hours=rng.randint(17, 22), minutes=rng.randint(0, 59),
+                                     seconds=rng.randint(0, 59), microseconds=rng.randint(0, 999_999))
+            add(employee_id, 'in', clock_in)
+            if rng.random() < 0.3:
+                add(employee_id, 'in', clock_in.add(minutes=rng.randint(1, 30)))
+            if (day, number) == (9, 2):
+                continue
+            clock_out = clock_in.add(hours=rng.randint(6, 10), minutes=rng.randint(0, 59))
+            add(employee_id, 'out', clock_out)
+            if rng.random() < 0.2:
+                add(employee_id, 'out', clock_out.add(minutes=rng.randint(1, 30)))
+    return punches
+
+def test_sql_engine_matches_python_on_many_employees_across_utc_midnight(client, make_employees, run_db):
+    employee_ids = make_employees(4)
+    response = client.post('/api/punch/bulk', json={'punches': shifts(employee_ids)})
+    assert response.json()['rejected'] == 0
+    now = pendulum.datetime(2024, 6, 12, tz='UTC')
+
+    results = {
+        engine: asdict(run_db(PayrollCalculator._compute_period_pay, START, END, engine, now))
+        for engine in ('python', 'numpy', 'sql')
+    }
+
+    assert results['python']['total_hours'] > 0
+    assert results['numpy'] == results['python']
+    assert results['sql'] == results['python']
@@ -0,0 +1,35 @@
+import uuid
+
+import pendulum
+
+import database as db
+from payroll import PayrollCalculator
+
+# A closed period no other test punches in
+START = pendulum.datetime(2023, 3, 1, tz='UTC')
+END = pendulum.datetime(2023, 3, 15, tz='UTC').end_of('day')
+
+def shift(employee_id: int, day: int, hours: int) -> list[tuple]:
+    clock_in = pendulum.datetime(2023, 3, day, 8, tz='UTC')
+    return [(employee_id, clock_in, 'in', uuid.uuid4().hex),
+            (employee_id, clock_in.add(hours=hours), 'out', uuid.uuid4().hex)]
+
+def test_punch_landing_between_compute_and_save_is_not_snapshotted(client, make_employees, run_db, monkeypatch):
+    [employee_id] = make_employees(1)
+    run_db(db.insert_time_entries_bulk, shift(employee_id, 2, 8))
+    compute = PayrollCalculator._compute_period_pay
+
+    async def compute_then_punch(*args):
+        calculation = await compute(*args)
+        # Back-dated into the period after its entries were read
+        await db.insert_time_entries_bulk(shift(employee_id, 3, 4))
+        return calculation
+
+    monkeypatch.setattr(PayrollCalculator, '_compute_period_pay', staticmethod(compute_then_punch))
+    assert run_db(PayrollCalculator.calculate_period_pay, START, END, 'python').total_hours == 8
+    monkeypatch.undo()
+
+    recomputed = run_db(PayrollCalculator.calculate_period_pay, START, END, 'python')
+    assert not recomputed.from_snapshot and recomputed.total_hours == 12
+    snapshot = run_db(PayrollCalculator.calculate_period_pay, START, END, 'python')
+    assert snapshot.from_snapshot and snapshot.total_hours == 12
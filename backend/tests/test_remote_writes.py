@@ -0,0 +1,62 @@
+import time
+from contextlib import asynccontextmanager
+
+import asyncpg
+import pendulum
+
+import database as db
+
+@asynccontextmanager
+async def other_worker():
+    """A connection of another worker, as its pool would open it"""
+    conn = await asyncpg.connect(db.db_manager.database_url, server_settings={'timezone': 'UTC', 'application_name': 'other'})
+    await db.DatabaseManager.init_connection(conn)
+    try:
+        yield conn
+    finally:
+        await conn.close()
+
+def eventually(check, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not (result := check()) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return result
+
+async def _rename_elsewhere(employee_id: int) -> None:
+    async with other_worker() as conn:
+        await conn.execute("UPDATE employees SET last_name = 'Remote' WHERE id = $1", employee_id)
+
+def test_other_workers_writes_drop_cached_reads(client, make_employees, run_db):
+    [employee_id] = make_employees(1)
+    client.get('/api/employees')
+
+    run_db(_rename_elsewhere, employee_id)
+
+    assert eventually(lambda: any(employee['last_name'] == 'Remote'
+                                  for employee in client.get('/api/employees').json()))
+
+async def _punch_elsewhere(employee_id: int, punch_time: pendulum.DateTime) -> None:
+    """What insert_time_entries_bulk does for one punch on another worker"""
+    async with other_worker() as conn:
+        async with conn.transaction():
+            entry_id = await conn.fetchval("""
+                INSERT INTO time_entries (employee_id, punch_time, entry_type) VALUES ($1, $2, 'in') RETURNING id
+            """, employee_id, punch_time)
+            await db._time_entries_changed(conn, [(employee_id, punch_time.date())])
+            await db._log_changes(conn, 'time_entry', [
+                (entry_id, 'insert', {'employee_id': employee_id, 'punch_time': punch_time, 'entry_type': 'in'})
+            ])
+
+def test_other_workers_punches_reach_the_clock_tracker(client, make_employees, run_db, monkeypatch):
+    [employee_id] = make_employees(1)
+    client.get('/api/hours/today', params={'employee_id': employee_id})
+
+    async def reload(*args):
+        raise AssertionError("the punch should be applied, not reloaded")
+    monkeypatch.setattr(db, 'warm_clock_tracker', reload)
+    run_db(_punch_elsewhere, employee_id, pendulum.now('UTC'))
+
+    def hours() -> dict:
+        return client.get('/api/hours/today', params={'employee_id': employee_id}).json()
+    assert eventually(lambda: hours()['is_clocked_in'])
+    assert hours()['entry_count'] == 1
@@ -0,0 +1,35 @@
+import pytest
+
+import exports
+import serialization
+from serialization import ARROW_MEDIA_TYPE, JSON_MEDIA_TYPE, MSGPACK_MEDIA_TYPE
+
+OFFERED = [JSON_MEDIA_TYPE, MSGPACK_MEDIA_TYPE, ARROW_MEDIA_TYPE]
+
+@pytest.mark.parametrize('accept, expected', [
+    (None, JSON_MEDIA_TYPE),
+    ('application/msgpack', MSGPACK_MEDIA_TYPE),
+    ('application/x-msgpack', MSGPACK_MEDIA_TYPE),
+    ('application/json;q=0.5, application/vnd.apache.arrow.stream', ARROW_MEDIA_TYPE),
+    ('text/html, */*;q=0.1', JSON_MEDIA_TYPE),
+    ('application/*', JSON_MEDIA_TYPE),
+    ('text/html', JSON_MEDIA_TYPE),
+])
+def test_negotiate(accept, expected):
+    assert serialization.negotiate(accept, OFFERED) == expected
+
+def test_type_wildcard_matches_its_major_type_only():
+    offered = ['text/csv', 'application/x-ndjson']
+    assert serialization.negotiate('application/*', offered) == 'application/x-ndjson'
+    assert serialization.negotiate('text/*', ['application/x-ndjson', 'text/csv']) == 'text/csv'
+    assert serialization.negotiate('image/*', offered) == 'text/csv'
+
+@pytest.mark.parametrize('accept, expected', [
+    ('', 'csv'),
+    ('text/*', 'csv'),
+    ('application/*', 'ndjson'),
+    ('application/x-ndjson, text/*;q=0.5', 'ndjson'),
+    ('text/*, application/*;q=0.5', 'csv'),
+])
+def test_export_format(accept, expected):
+    assert exports.export_format(accept) == expected
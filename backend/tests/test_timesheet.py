@@ -0,0 +1,61 @@
+import pendulum
+
+DAY = '2025-03-03'
+
+def at(hour: int, minute: int = 0) -> pendulum.DateTime:
+    return pendulum.datetime(2025, 3, 3, hour, minute, tz='UTC')
+
+def punch(employee_id: int, key: str, entry_type: str, time: pendulum.DateTime) -> dict:
+    return {'employee_id': employee_id, 'client_key': f'{employee_id}-{key}',
+            'entry_type': entry_type, 'timestamp': time.to_iso8601_string()}
+
+def edit(employee_id: int, field: str, value) -> dict:
+    return {'employee_id': employee_id, 'date': DAY, 'field': field, 'value': value}
+
+def split_shift(client, employee_id: int) -> None:
+    response = client.post('/api/punch/bulk', json={'punches': [
+        punch(employee_id, 'a', 'in', at(7)), punch(employee_id, 'b', 'out', at(11)),
+        punch(employee_id, 'c', 'in', at(12)), punch(employee_id, 'd', 'out', at(16)),
+    ]})
+    assert response.json()['created'] == 4
+
+def test_cell_edit_moves_only_the_shown_punch(client, make_employees, stored_punches):
+    [employee_id] = make_employees(1)
+    split_shift(client, employee_id)
+
+    response = client.patch('/api/timesheet', json={'edits': [
+        edit(employee_id, 'in', '08:00'), edit(employee_id, 'out', '17:30')]})
+    assert response.status_code == 200, response.text
+
+    assert stored_punches(employee_id) == [
+        ('in', at(8)), ('out', at(11)), ('in', at(12)), ('out', at(17, 30))]
+
+def test_clearing_a_cell_deletes_only_the_shown_punch(client, make_employees, stored_punches):
+    [employee_id] = make_employees(1)
+    split_shift(client, employee_id)
+
+    response = client.patch('/api/timesheet', json={'edits': [edit(employee_id, 'out', '')]})
+    assert response.status_code == 200, response.text
+
+    assert stored_punches(employee_id) == [('in', at(7)), ('out', at(11)), ('in', at(12))]
+
+def test_cell_edit_on_an_empty_day_inserts_a_punch(client, make_employees, stored_punches):
+    [employee_id] = make_employees(1)
+
+    response = client.patch('/api/timesheet', json={'edits': [
+        edit(employee_id, 'in', '09:15'), edit(employee_id, 'out', '')]})
+    assert response.status_code == 200, response.text
+
+    assert stored_punches(employee_id) == [('in', at(9, 15))]
+
+def test_verified_requires_a_json_boolean(client, make_employees):
+    [employee_id] = make_employees(1)
+
+    for value in ('false', 'true', 1, None):
+        response = client.patch('/api/timesheet', json={'edits': [edit(employee_id, 'verified', value)]})
+        assert response.status_code == 400, value
+
+    response = client.patch('/api/timesheet', json={'edits': [edit(employee_id, 'verified', True)]})
+    assert response.status_code == 200
+    cells = client.get('/api/timesheet', params={'year': 2025, 'month': 3}).json()['cells']
+    assert cells[f'{employee_id}-3-verified'] is True
@@ -0,0 +1,160 @@
+"""Columnar time entries: one NumPy array per column instead of a dict per punch.
+
+As dicts with pendulum timestamps a punch costs several hundred bytes of Python
+objects; a TimeEntryBatch stores 17. Batches are ordered by punch time (or by
+employee, then punch time, see by_employee), so the entries of one day or one
+employee are a contiguous range and slicing one out returns views, not copies.
+"""
+import numpy as np
+import pendulum
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Iterable, Iterator, Optional
+
+from payroll_core import Day
+from payroll_vectorized import ENTRY_IN, ENTRY_OUT, ENTRY_SICK, ENTRY_VACATION, ENTRY_TYPE_CODES, MICROS_PER_DAY
+
+# Entry types by code
+ENTRY_TYPES = ('in', 'out', 'sick', 'vacation')
+
+# employee_ids value of punches without an employee (ids start at 1)
+NO_EMPLOYEE = 0
+
+EPOCH_ORDINAL = pendulum.date(1970, 1, 1).toordinal()
+_EPOCH_DATETIME = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Binary COPY framing of (id int4, punch_time timestamptz, entry code int2, employee id int4)
+# rows: a field count, then a length before every value; timestamps count microseconds from 2000
+_COPY_SIGNATURE_SIZE = 11
+_COPY_ROW = np.dtype([
+    ('field_count', '>i2'),
+    ('id_size', '>i4'), ('id', '>i4'),
+    ('punch_size', '>i4'), ('punch_time', '>i8'),
+    ('code_size', '>i4'), ('entry_code', '>i2'),
+    ('employee_size', '>i4'), ('employee_id', '>i4'),
+])
+_PG_EPOCH_MICROS = 946_684_800 * 1_000_000
+
+def epoch_micros(moment: datetime) -> int:
+    """Exact microseconds since the Unix epoch of an aware datetime"""
+    delta = datetime.__sub__(moment, _EPOCH_DATETIME)
+    return (delta.days * 86_400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+def _runs(keys: np.ndarray) -> Iterator[tuple[int, int]]:
+    """(start, stop) of every run of equal keys"""
+    if not len(keys):
+        return iter(())
+    boundaries = (np.flatnonzero(keys[1:] != keys[:-1]) + 1).tolist()
+    return zip([0, *boundaries], [*boundaries, len(keys)])
+
+class TimeEntryBatch:
+    __slots__ = ('ids', 'punch_micros', 'entry_codes', 'employee_ids')
+
+    def __init__(self, ids: np.ndarray, punch_micros: np.ndarray, entry_codes: np.ndarray,
+                 employee_ids: np.ndarray):
+        self.ids = ids                    # int32
+        self.punch_micros = punch_micros  # int64, epoch microseconds
+        self.entry_codes = entry_codes    # int8, see ENTRY_TYPES
+        self.employee_ids = employee_ids  # int32, NO_EMPLOYEE when unassigned
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[dict]) -> 'TimeEntryBatch':
+        """Build from time entry dicts (sorted by punch time); employee_id is optional"""
+        entries = list(entries)
+        return cls(
+            np.fromiter((entry.get('id') or 0 for entry in entries), dtype=np.int32, count=len(entries)),
+            np.fromiter((epoch_micros(entry['punch_time']) for entry in entries), dtype=np.int64, count=len(entries)),
+            np.fromiter((ENTRY_TYPE_CODES[entry['entry_type']] for entry in entries), dtype=np.int8, count=len(entries)),
+            np.fromiter((entry.get('employee_id') or NO_EMPLOYEE for entry in entries), dtype=np.int32,
+                        count=len(entries)),
+        )
+
+    @classmethod
+    def from_copy(cls, data: bytes) -> 'TimeEntryBatch':
+        """Parse binary COPY output of (id, punch_time, entry code, employee id) rows.
+
+        The employee id must not be NULL (COALESCE it to NO_EMPLOYEE) so every row
+        has the same width and the whole payload maps onto one structured array.
+        """
+        header_size = _COPY_SIGNATURE_SIZE + 8 + int.from_bytes(data[15:19], 'big')
+        # Everything after the header but the two-byte trailer is rows
+        count = (len(data) - header_size - 2) // _COPY_ROW.itemsize
+        rows = np.frombuffer(data, dtype=_COPY_ROW, count=count, offset=header_size)
+        return cls(rows['id'].astype(np.int32),
+                   np.add(rows['punch_time'], _PG_EPOCH_MICROS, dtype=np.int64),
+                   rows['entry_code'].astype(np.int8),
+                   rows['employee_id'].astype(np.int32))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, index: slice) -> 'TimeEntryBatch':
+        """Rows ``index`` as views of this batch's columns"""
+        return TimeEntryBatch(self.ids[index], self.punch_micros[index], self.entry_codes[index],
+                              self.employee_ids[index])
+
+    @property
+    def nbytes(self) -> int:
+        return self.ids.nbytes + self.punch_micros.nbytes + self.entry_codes.nbytes + self.employee_ids.nbytes
+
+    def entry_types(self) -> list[str]:
+        return [ENTRY_TYPES[code] for code in self.entry_codes.tolist()]
+
+    def clock_times(self) -> list[str]:
+        """UTC 'HH:mm' of every punch"""
+        minutes = (self.punch_micros % MICROS_PER_DAY // 60_000_000).tolist()
+        return ['%02d:%02d' % divmod(minute, 60) for minute in minutes]
+
+    def iter_days(self) -> Iterator[tuple[pendulum.Date, 'TimeEntryBatch']]:
+        """(UTC date, that day's entries) for every day with entries; needs punch time order"""
+        epoch_days = self.punch_micros // MICROS_PER_DAY
+        for start, stop in _runs(epoch_days):
+            yield pendulum.Date.fromordinal(EPOCH_ORDINAL + int(epoch_days[start])), self[start:stop]
+
+    def by_employee(self) -> 'TimeEntryBatch':
+        """The same entries ordered by employee, then punch time (copied once, unless already so)"""
+        if np.all(self.employee_ids[1:] >= self.employee_ids[:-1]):
+            return self
+        order = np.argsort(self.employee_ids, kind='stable')
+        return TimeEntryBatch(self.ids[order], self.punch_micros[order], self.entry_codes[order],
+                              self.employee_ids[order])
+
+    def iter_employees(self) -> Iterator[tuple[Optional[int], 'TimeEntryBatch']]:
+        """(employee id, their entries in punch time order); None for unassigned punches"""
+        ordered = self.by_employee()
+        for start, stop in _runs(ordered.employee_ids):
+            employee_id = int(ordered.employee_ids[start])
+            yield (None if employee_id == NO_EMPLOYEE else employee_id), ordered[start:stop]
+
+    def work_hours(self, now_micros: int) -> Decimal:
+        """payroll_core.calculate_daily_hours over this batch's in/out punches"""
+        total_seconds = Decimal('0')
+        in_time = None
+
+        for punch, code in zip(self.punch_micros.tolist(), self.entry_codes.tolist()):
+            if code == ENTRY_IN:
+                in_time = punch
+            elif code == ENTRY_OUT and in_time is not None:
+                total_seconds += Decimal(str((punch - in_time) / 1_000_000))
+                in_time = None
+
+        # If still clocked in, count until now
+        if in_time is not None:
+            total_seconds += Decimal(str((now_micros - in_time) / 1_000_000))
+
+        return total_seconds / Decimal('3600')
+
+    def days(self, current_time: pendulum.DateTime = None) -> Iterator[Day]:
+        """payroll_core.entry_days over this batch (one employee, or all pooled together)"""
+        if current_time is None:
+            current_time = pendulum.now('UTC')
+        now_micros = epoch_micros(current_time)
+
+        for work_date, day in self.iter_days():
+            codes = day.entry_codes
+            if (codes == ENTRY_SICK).any():
+                yield work_date, 'sick', None
+            elif (codes == ENTRY_VACATION).any():
+                yield work_date, 'vacation', None
+            elif (codes <= ENTRY_OUT).any():
+                yield work_date, None, day.work_hours(now_micros)